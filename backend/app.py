@@ -4,16 +4,32 @@ import re
 import random
 import time
 import hashlib
-from typing import Any, Dict, List, Tuple, Optional
+import hmac
+import multiprocessing
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Tuple, Optional, Union
 
-import requests
 import pdfplumber
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 
 from dotenv import load_dotenv
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from flask_migrate import Migrate
-from models import db, Test, Question, Choice, AiQuestion
+from models import db, Test, Question, Choice, AiQuestion, AiQuestionLsh
+from ollama_client import OllamaClient, CircuitBreaker
+from llm_json import JsonItemParser, SalvageStats, salvage_items
+from pdf_extract import BACKENDS as PDF_BACKENDS, PDF_ERRORS, ParallelExtractor, page_count, parse_page_ranges
+from pdf_cache import PdfTextCache, spool_upload
+from pdf_jobs import ImportJobs
+from near_dup import LshIndex, MinHasher, NearDupStats, sig_from_bytes, sig_to_bytes, similarity
+from seen_store import SeenStore
+from bloom import ScalableBloomFilter
+from gen_cache import GenerationCache, SingleFlight
+from question_pool import Prewarmer, SparePool
+from question_schema import QUESTION_SCHEMAS, LESSON_QUIZ_FORMAT, batch_format, matches
 
 
 app = Flask(__name__)
@@ -40,12 +56,46 @@ OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434")
 OLLAMA_URL = os.getenv("OLLAMA_URL", f"{OLLAMA_BASE_URL}/api/generate")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b-instruct-q4_K_M")
 USE_OLLAMA = os.getenv("USE_OLLAMA", "0") == "1"
+# token streaming + incremental JSON parsing (stop as soon as we have enough)
+OLLAMA_STREAM = os.getenv("OLLAMA_STREAM", "1") == "1"
+# send the per-type JSON Schema as Ollama's structured `format` (needs Ollama >= 0.5)
+OLLAMA_FORMAT_SCHEMA = os.getenv("OLLAMA_FORMAT_SCHEMA", "1") == "1"
 
 
 OLLAMA_TEMPERATURE = float(os.getenv("OLLAMA_TEMPERATURE", "0.9"))
 OLLAMA_TOP_P = float(os.getenv("OLLAMA_TOP_P", "0.95"))
 OLLAMA_REPEAT_PENALTY = float(os.getenv("OLLAMA_REPEAT_PENALTY", "1.15"))
 
+# counters for model output that only parsed partially (see /api/health)
+salvage_stats = SalvageStats()
+
+# ===== Generation cache (deterministic /api/ai/* prompts) =====
+gen_cache = GenerationCache(
+    max_bytes=int(os.getenv("GEN_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+    ttl_sec=float(os.getenv("GEN_CACHE_TTL_SEC", str(24 * 3600))),
+    disk_dir=os.path.join(DATA_DIR, "gen_cache") if os.getenv("GEN_CACHE_DISK", "0") == "1" else None,
+    disk_max_bytes=int(os.getenv("GEN_CACHE_DISK_MAX_BYTES", str(256 * 1024 * 1024))),
+)
+
+# identical concurrent generations wait on one in-flight Ollama call
+gen_flights = SingleFlight()
+
+# ===== Ollama HTTP client (pooled keep-alive, shared by all generators) =====
+ollama = OllamaClient(
+    OLLAMA_URL,
+    pool_size=int(os.getenv("OLLAMA_POOL_SIZE", "10")),
+    connect_timeout=float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "3")),
+    read_timeout=float(os.getenv("OLLAMA_READ_TIMEOUT", "120")),
+    max_retries=int(os.getenv("OLLAMA_MAX_RETRIES", "2")),
+    backoff=float(os.getenv("OLLAMA_RETRY_BACKOFF", "0.5")),
+    max_concurrency=int(os.getenv("OLLAMA_MAX_CONCURRENCY", "0")),
+    # after N consecutive failures/timeouts skip Ollama for a cooldown (mock/fallback only)
+    breaker=CircuitBreaker(
+        threshold=int(os.getenv("OLLAMA_BREAKER_THRESHOLD", "5")),
+        cooldown=float(os.getenv("OLLAMA_BREAKER_COOLDOWN", "30")),
+    ),
+)
+
 
 def _ensure_data_dir():
     os.makedirs(DATA_DIR, exist_ok=True)
@@ -160,6 +210,11 @@ def ai_generate_quiz_from_text():
     if isinstance(save, str):
         save = save.strip().lower() not in ("0", "false", "no")
 
+    # optional: bypass the generation cache (default: use it)
+    use_cache = body.get("cache", True)
+    if isinstance(use_cache, str):
+        use_cache = use_cache.strip().lower() not in ("0", "false", "no")
+
     if not lesson_text:
         return jsonify({"ok": False, "error": "text (lesson_text) is required"}), 400
 
@@ -167,8 +222,13 @@ def ai_generate_quiz_from_text():
 
     used_source = "fallback"
     try:
-        payload = try_ollama_generate(prompt)
-        questions = normalize_questions(payload)
+        payload = try_ollama_generate(
+            prompt,
+            timeout_sec=min(60, max(MIN_ATTEMPT_SEC, _request_deadline(body) - time.monotonic())),
+            stop_after=count,
+            use_cache=bool(use_cache)
+        )
+        questions = _drop_near_dups(normalize_questions(payload))
         if not questions:
             raise ValueError("No questions returned")
         used_source = "ollama"
@@ -178,32 +238,89 @@ def ai_generate_quiz_from_text():
             fallback_questions(subject, "From lesson text", difficulty, count)
         )
 
-    saved_ids = []
-    if save:
+    saved_ids, existing_ids = [], []
+    save_queued = False
+    if save and _wants_write_behind(body):
+        save_questions_async(subject, "From lesson text", difficulty, questions, used_source)
+        save_queued = True
+    elif save:
         try:
-            saved_ids = save_questions(subject, "From lesson text", difficulty, questions, used_source)
+            saved_ids, existing_ids = save_questions(subject, "From lesson text", difficulty, questions, used_source)
         except Exception:
             # If DB save fails, still return questions
-            saved_ids = []
+            db.session.rollback()
+            saved_ids, existing_ids = [], []
 
-    return jsonify({
+    resp = {
         "ok": True,
         "source": used_source,
         "saved_ids": saved_ids,
+        "existing_ids": existing_ids,
         "questions": questions
-    })
+    }
+    if save_queued:
+        resp["save_queued"] = True
+    return jsonify(resp)
 
 @app.get("/api/ai/questions")
 def list_saved_questions():
-    material = (request.args.get("material") or "").strip()
-    limit = int(request.args.get("limit") or 50)
+    """
+    Newest first. Keyset pagination: pass `before_id` = next_before_id for the
+    next (older) page, or `after_id` = prev_after_id for the previous (newer) one.
+    Filters: material, topic, difficulty, qtype, source, created_from/created_to (unix seconds),
+    choice (exact choice text; GIN @> on PostgreSQL).
+    On PostgreSQL/SQLite each item is rendered to JSON by the database (LIST_DB_RENDER).
+    """
+    args = request.args
+    material = (args.get("material") or "").strip()
+    limit = int(args.get("limit") or 50)
     limit = max(1, min(limit, 200))
 
     q = AiQuestion.query
     if material:
         q = q.filter(AiQuestion.material == material)
+    for field in ("topic", "difficulty", "qtype", "source"):
+        value = (args.get(field) or "").strip()
+        if value:
+            q = q.filter(getattr(AiQuestion, field) == value)
+    created_from = args.get("created_from", type=int)
+    created_to = args.get("created_to", type=int)
+    if created_from is not None:
+        q = q.filter(AiQuestion.created_at >= created_from)
+    if created_to is not None:
+        q = q.filter(AiQuestion.created_at <= created_to)
+
+    choice = (args.get("choice") or "").strip()
+    if choice:
+        q = q.filter(_choice_filter(choice))
+
+    before_id = args.get("before_id", type=int)
+    after_id = args.get("after_id", type=int)
+    if after_id is not None:
+        # walk forward from the cursor, then flip back to newest-first
+        q = q.filter(AiQuestion.id > after_id).order_by(AiQuestion.id.asc())
+    else:
+        if before_id is not None:
+            q = q.filter(AiQuestion.id < before_id)
+        q = q.order_by(AiQuestion.id.desc())
+    q = q.limit(limit)
+
+    item_json = _item_json_expr()
+    if item_json is not None:
+        # no json.loads/json.dumps per row: the database hands back finished JSON text
+        rendered = q.with_entities(AiQuestion.id, item_json).all()
+        if after_id is not None:
+            rendered.reverse()
+        body = '{"ok": true, "next_before_id": %s, "prev_after_id": %s, "items": [%s]}' % (
+            json.dumps(rendered[-1][0] if rendered else None),
+            json.dumps(rendered[0][0] if rendered else None),
+            ",".join(r[1] for r in rendered),
+        )
+        return Response(body, mimetype="application/json")
 
-    rows = q.order_by(AiQuestion.id.desc()).limit(limit).all()
+    rows = q.all()
+    if after_id is not None:
+        rows.reverse()
 
     out = []
     for r in rows:
@@ -212,16 +329,66 @@ def list_saved_questions():
             "material": r.material,
             "topic": r.topic,
             "difficulty": r.difficulty,
-            "qtype": r.qtype,
-            "question": r.question,
-            "choices": json.loads(r.choices_json or "[]"),
-            "answer": r.answer,
-            "explanation": r.explanation,
+            **_bank_question(r),
             "source": r.source,
             "created_at": r.created_at,
         })
 
-    return jsonify({"ok": True, "items": out})
+    return jsonify({
+        "ok": True,
+        "items": out,
+        "next_before_id": rows[-1].id if rows else None,
+        "prev_after_id": rows[0].id if rows else None,
+    })
+
+
+LIST_DB_RENDER = os.getenv("LIST_DB_RENDER", "1") == "1"
+
+_LIST_FIELDS = (
+    "id", "material", "topic", "difficulty", "qtype", "question",
+    "choices", "answer", "explanation", "source", "created_at",
+)
+
+def _item_json_expr():
+    """One JSON object per row, built by the database (None = render in Python)."""
+    if not LIST_DB_RENDER:
+        return None
+    dialect = db.engine.dialect.name
+    args = []
+    for name in _LIST_FIELDS:
+        col = getattr(AiQuestion, name)
+        if name == "choices":
+            col = db.func.coalesce(col, db.literal_column("'[]'"))
+            if dialect == "sqlite":
+                col = db.func.json(col)  # embed as JSON, not as a quoted string
+        args += [db.literal_column(f"'{name}'"), col]
+    if dialect == "postgresql":
+        return db.cast(db.func.jsonb_build_object(*args), db.Text)
+    if dialect == "sqlite":
+        return db.func.json_object(*args)
+    return None
+
+def _choice_filter(choice: str):
+    if db.engine.dialect.name == "postgresql":
+        # jsonb @> '["..."]' -> served by ix_ai_questions_choices_gin (jsonb_path_ops)
+        return db.cast(AiQuestion.choices, JSONB).contains([choice])
+    if db.engine.dialect.name == "sqlite":
+        return db.text(
+            "EXISTS (SELECT 1 FROM json_each(ai_questions.choices) WHERE json_each.value = :choice)"
+        ).bindparams(choice=choice)
+    return AiQuestion.id.in_([])  # not supported on this database
+
+
+def _bank_question(r: AiQuestion) -> Dict[str, Any]:
+    """ai_questions row -> the question shape returned by normalize_questions."""
+    return {
+        "id": r.id,
+        "qtype": r.qtype,
+        "question": r.question,
+        "choices": r.choices or [],
+        "answer": r.answer,
+        "explanation": r.explanation,
+    }
 
 
 def extract_json_object(text: str):
@@ -253,24 +420,97 @@ def extract_json_object(text: str):
     return json.loads(m.group(0))
 
 
-def try_ollama_generate(prompt: str, timeout_sec: int = 60):
+def _ollama_stream_items(payload: dict, timeout_sec: float) -> Iterator[Any]:
+    """
+    Stream a generation and yield each question object as soon as it closes.
+    Close this iterator to cancel the generation. If the stream fails after some
+    items (timeout, dropped connection), it ends early and keeps them.
+    Broken responses are counted in salvage_stats like on the non-streaming path.
+    """
+    parser = JsonItemParser()
+    cut = False
+    try:
+        with closing(ollama.generate_stream(payload, read_timeout=timeout_sec)) as frags:
+            for frag in frags:
+                yield from parser.feed(frag)
+    except GeneratorExit:
+        # cancelled by us once we had enough: the unread rest is not known to be broken
+        if parser.errors:
+            salvage_stats.record(parser.objects, parser.errors)
+        raise
+    except Exception:
+        if not parser.objects:
+            raise
+        cut = True
+
+    dropped = parser.errors + (1 if parser.truncated else 0)
+    if dropped or cut:
+        salvage_stats.record(parser.objects, dropped)
+
+
+def _salvage_or_raise(text: str, error: str) -> List[Any]:
+    """Whole-response parse failed: keep every well-formed item, count the rest."""
+    items, dropped = salvage_items(text)
+    salvage_stats.record(len(items), dropped)
+    if not items:
+        raise ValueError(error)
+    return items
+
+
+def try_ollama_generate(
+    prompt: str, timeout_sec: int = 60, stop_after: Optional[int] = None, use_cache: bool = True
+):
     payload = {
         "model": OLLAMA_MODEL,
         "prompt": prompt,
         "stream": False,
-        "format": "json",  # ✅ هذا أهم سطر: يجبر الرد يكون JSON صحيح
+        "format": LESSON_QUIZ_FORMAT if OLLAMA_FORMAT_SCHEMA else "json",  # ✅ هذا أهم سطر: يجبر الرد يكون JSON صحيح
         "options": {
             "temperature": 0.2
         }
     }
 
-    r = requests.post(OLLAMA_URL, json=payload, timeout=timeout_sec)
-    r.raise_for_status()
+    # same model + prompt + options => same answer; don't pay for it twice
+    key = GenerationCache.key(payload)
+    if not use_cache:
+        obj = _try_ollama_generate_uncached(payload, timeout_sec, stop_after)
+        gen_cache.put(key, obj)
+        return obj
+
+    cached = gen_cache.get(key)
+    if cached is not None:
+        return cached
+
+    def run():
+        obj = _try_ollama_generate_uncached(payload, timeout_sec, stop_after)
+        gen_cache.put(key, obj)
+        return obj
 
-    text = (r.json().get("response") or "").strip()
+    # a coalesced caller waits no longer than its own deadline, then falls back like a timed-out call
+    return gen_flights.do(key, run, timeout=timeout_sec)
+
+
+def _try_ollama_generate_uncached(payload: dict, timeout_sec: float, stop_after: Optional[int]):
+
+    if OLLAMA_STREAM:
+        items = []
+        with closing(_ollama_stream_items(payload, timeout_sec)) as stream:
+            for item in stream:
+                if isinstance(item, dict) and item.get("question"):
+                    items.append(item)
+                if stop_after and len(items) >= stop_after:
+                    break
+        if not items:
+            raise ValueError("Invalid JSON format: missing 'questions'")
+        return {"questions": items}
+
+    text = (ollama.generate(payload, read_timeout=timeout_sec).get("response") or "").strip()
 
     # غالبًا بعد format=json بيكون JSON نظيف، بس نخلي الاستخراج احتياط
-    obj = extract_json_object(text)
+    try:
+        obj = extract_json_object(text)
+    except Exception:
+        obj = {"questions": _salvage_or_raise(text, "Invalid JSON format: missing 'questions'")}
 
     if not isinstance(obj, dict) or "questions" not in obj:
         raise ValueError("Invalid JSON format: missing 'questions'")
@@ -323,29 +563,241 @@ def normalize_questions(payload: dict):
         })
     return cleaned
 
-def save_questions(material: str, topic: str, difficulty: str, questions: list, source: str):
+def _norm_text(s: str) -> str:
+    # like _norm but keeps non-Latin letters (Arabic lessons)
+    s = (s or "").strip().lower()
+    s = re.sub(r"[^\w\s]", "", s)
+    return re.sub(r"\s+", " ", s).strip()
+
+def _bank_fingerprint(q: Dict[str, Any]) -> str:
+    """
+    Stable per-question fingerprint stored in ai_questions.fingerprint
+    (unique per material). Keep in sync with migration c2d8f0a6e913.
+    """
+    parts = [q.get("qtype") or "mcq", _norm_text(q.get("question", ""))]
+    parts += [_norm_text(str(c)) for c in (q.get("choices") or [])]
+    parts.append(_norm_text(q.get("answer", "")))
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+# ===== Near-duplicate detection: MinHash signatures + LSH buckets =====
+NEAR_DUP = os.getenv("NEAR_DUP", "1") == "1"
+# conservative: template questions ("She ____ ..." / "They ____ ...") share most 3-grams
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.6"))
+
+near_hasher = MinHasher()
+near_bands = LshIndex()  # bucket layout of ai_question_lsh
+near_dup_stats = NearDupStats()
+
+def _near_text(q: Dict[str, Any]) -> str:
+    # no passage: different questions on one reading passage are not duplicates
+    opts = q.get("choices") or q.get("words") or []
+    return " ".join([str(q.get("question", ""))] + [str(o) for o in opts])
+
+def _near_answer(q: Dict[str, Any]) -> str:
+    """Correct answer as text (the choice for correctIndex questions)."""
+    choices = q.get("choices") or []
+    ci = q.get("correctIndex")
+    if isinstance(ci, int) and 0 <= ci < len(choices):
+        return str(choices[ci])
+    return str(q.get("answer", ""))
+
+def _near_sig(q: Dict[str, Any]):
+    # keyed by the answer: same wording with a different correct answer is a different question
+    return near_hasher.signature(_near_text(q), key=_near_answer(q))
+
+def _near_index() -> Optional[LshIndex]:
+    return LshIndex(threshold=NEAR_DUP_THRESHOLD) if NEAR_DUP else None
+
+def _is_near_dup(q: Dict[str, Any], near: LshIndex) -> bool:
+    """True if q is close to a question already in `near`; otherwise q is added to it."""
+    sig = _near_sig(q)
+    if near.query(sig):
+        return True
+    near.add(len(near), sig)
+    return False
+
+def _drop_near_dups(qs: List[Dict[str, Any]], prior: List[Dict[str, Any]] = ()) -> List[Dict[str, Any]]:
+    """Keep the first of every group of near-duplicates in qs (and drop ones close to `prior`)."""
+    near = _near_index()
+    if near is None:
+        return qs
+    for q in prior:
+        near.add(len(near), _near_sig(q))
+    out = [q for q in qs if not _is_near_dup(q, near)]
+    near_dup_stats.record(len(qs), in_request=len(qs) - len(out))
+    return out
+
+# built once: this runs on every save, statement construction would cost more than the lookup
+_NEAR_LOOKUP = (
+    db.select(AiQuestionLsh.bucket, AiQuestion.id, AiQuestion.minhash)
+    .join(AiQuestion, AiQuestion.id == AiQuestionLsh.question_id)
+    .where(
+        AiQuestionLsh.material == db.bindparam("material"),
+        AiQuestionLsh.bucket.in_(db.bindparam("buckets", expanding=True)),
+    )
+)
+
+def _bank_near_dups(material: str, sigs: List[Tuple[int, ...]]) -> Dict[int, int]:
+    """
+    {index in sigs: id of a saved question of `material` at >= NEAR_DUP_THRESHOLD}
+    with one indexed lookup on ai_question_lsh (material, bucket).
+    """
+    by_bucket: Dict[int, List[int]] = {}
+    for i, sig in enumerate(sigs):
+        for b in near_bands.buckets(sig):
+            by_bucket.setdefault(b, []).append(i)
+    if not by_bucket:
+        return {}
+
+    rows = db.session.execute(_NEAR_LOOKUP, {"material": material, "buckets": list(by_bucket)}).all()
+    best: Dict[int, Tuple[float, int]] = {}
+    for bucket, qid, raw in rows:
+        if not raw:
+            continue
+        saved = sig_from_bytes(raw)
+        for i in by_bucket[bucket]:
+            s = similarity(sigs[i], saved)
+            if s >= NEAR_DUP_THRESHOLD and s > best.get(i, (0.0, 0))[0]:
+                best[i] = (s, qid)
+    return {i: qid for i, (_, qid) in best.items()}
+
+def save_questions(
+    material: str, topic: str, difficulty: str, questions: list, source: str
+) -> Tuple[List[int], List[int]]:
+    """
+    One multi-row INSERT ... ON CONFLICT (material, fingerprint) DO NOTHING RETURNING
+    for the whole batch + one commit. Returns (new_ids, existing_ids): questions already
+    in the bank for this material are not stored again, their existing ids are reported.
+    With NEAR_DUP, questions within NEAR_DUP_THRESHOLD of a saved one count as existing too.
+    """
+    if not questions:
+        return [], []
     now = int(time.time())
-    ids = []
-
-    for q in questions:
-        row = AiQuestion(
-            material=material,
-            topic=topic,
-            difficulty=difficulty,
-            qtype=q.get("qtype", "mcq"),
-            question=q["question"],
-            choices_json=json.dumps(q.get("choices", []), ensure_ascii=False),
-            answer=q["answer"],
-            explanation=q.get("explanation", ""),
-            source=source,
-            created_at=now
+
+    near_existing: Dict[int, int] = {}
+    sigs = [_near_sig(q) for q in questions]
+    if NEAR_DUP:
+        near_existing = _bank_near_dups(material, sigs)
+        near_dup_stats.record(len(questions), in_bank=len(near_existing))
+
+    rows = [
+        {
+            "material": material,
+            "topic": topic,
+            "difficulty": difficulty,
+            "qtype": q.get("qtype", "mcq"),
+            "question": q["question"],
+            "choices": q.get("choices", []),
+            "answer": q["answer"],
+            "explanation": q.get("explanation", ""),
+            "source": source,
+            "created_at": now,
+            "fingerprint": _bank_fingerprint(q),
+            "minhash": sig_to_bytes(sig),
+        }
+        for i, (q, sig) in enumerate(zip(questions, sigs))
+        if i not in near_existing
+    ]
+    if not rows:
+        db.session.commit()
+        return [], sorted(set(near_existing.values()))
+
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        upsert = pg_insert
+    elif dialect == "sqlite":
+        upsert = sqlite_insert
+    else:
+        raise RuntimeError(f"save_questions: ON CONFLICT not supported on {dialect}")
+
+    stmt = (
+        upsert(AiQuestion)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["material", "fingerprint"])
+        .returning(AiQuestion.id, AiQuestion.fingerprint)
+    )
+    inserted = {fp: rid for rid, fp in db.session.execute(stmt).all()}
+
+    if inserted:
+        sig_by_fp = {r["fingerprint"]: sig_from_bytes(r["minhash"]) for r in rows}
+        db.session.execute(
+            AiQuestionLsh.__table__.insert(),  # Core executemany: no ORM bookkeeping per row
+            [
+                {"material": material, "bucket": b, "question_id": rid}
+                for fp, rid in inserted.items()
+                for b in set(near_bands.buckets(sig_by_fp[fp]))
+            ],
         )
-        db.session.add(row)
-        db.session.flush()  # عشان نجيب id
-        ids.append(row.id)
 
+    wanted = {r["fingerprint"] for r in rows}
+    existing: Dict[str, int] = {}
+    missing = wanted - set(inserted)
+    if missing:
+        existing = dict(
+            db.session.query(AiQuestion.fingerprint, AiQuestion.id)
+            .filter(AiQuestion.material == material, AiQuestion.fingerprint.in_(missing))
+            .all()
+        )
     db.session.commit()
-    return ids
+
+    return sorted(inserted.values()), sorted(set(existing.values()) | set(near_existing.values()))
+
+
+# ===== Write-behind saves: respond first, commit in the background =====
+SAVE_WRITE_BEHIND = os.getenv("SAVE_WRITE_BEHIND", "0") == "1"
+_save_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="save-behind")
+
+def save_questions_async(material: str, topic: str, difficulty: str, questions: list, source: str):
+    def run():
+        with app.app_context():
+            try:
+                save_questions(material, topic, difficulty, questions, source)
+            except Exception:
+                db.session.rollback()
+                app.logger.exception("write-behind save_questions failed")
+
+    _save_pool.submit(run)
+
+
+def _wants_write_behind(body: dict) -> bool:
+    v = body.get("save_async", SAVE_WRITE_BEHIND)
+    if isinstance(v, str):
+        v = v.strip().lower() not in ("0", "false", "no", "")
+    return bool(v)
+
+
+def sample_bank_questions(
+    material: str, topic: str, difficulty: str, qtype: str, k: int, exclude_ids: List[int]
+) -> List[AiQuestion]:
+    """
+    Random sample of up to k matching rows without ORDER BY random():
+    seek from a random id inside [min(id), max(id)] of the matching rows
+    (index range scan), wrap around to the start if the tail is short.
+    Fallback placeholders saved when the model failed are never served.
+    """
+    filters = [AiQuestion.material == material, AiQuestion.qtype == qtype, AiQuestion.source != "fallback"]
+    if topic:
+        filters.append(AiQuestion.topic == topic)
+    if difficulty:
+        filters.append(AiQuestion.difficulty == difficulty)
+
+    lo, hi = db.session.query(db.func.min(AiQuestion.id), db.func.max(AiQuestion.id)).filter(*filters).one()
+    if lo is None:
+        return []
+
+    q = AiQuestion.query.filter(*filters)
+    if exclude_ids:
+        q = q.filter(AiQuestion.id.notin_(exclude_ids))
+
+    # read a bit more than k around the pivot and shuffle, so repeat calls differ
+    window = k * 2
+    pivot = random.randint(lo, hi)
+    rows = q.filter(AiQuestion.id >= pivot).order_by(AiQuestion.id).limit(window).all()
+    if len(rows) < window:
+        rows += q.filter(AiQuestion.id < pivot).order_by(AiQuestion.id).limit(window - len(rows)).all()
+
+    random.shuffle(rows)
+    return rows[:k]
 
 
 @app.post("/api/ai/generate-questions")
@@ -360,23 +812,66 @@ def ai_generate_questions():
         return jsonify({"ok": False, "error": "material is required"}), 400
     count = max(1, min(count, 20))
 
-    prompt = build_prompt(material, topic, difficulty, count)
+    use_cache = body.get("cache", True)
+    if isinstance(use_cache, str):
+        use_cache = use_cache.strip().lower() not in ("0", "false", "no")
+
+    # optional: serve from the saved bank first, generate only the shortfall
+    use_bank = body.get("bank", False)
+    if isinstance(use_bank, str):
+        use_bank = use_bank.strip().lower() not in ("0", "false", "no", "")
+    exclude_ids = body.get("exclude_ids") or []
+    if not isinstance(exclude_ids, list):
+        exclude_ids = []
+    exclude_ids = [int(x) for x in exclude_ids if str(x).strip().isdigit()]
+
+    banked = []
+    if use_bank:
+        try:
+            rows = sample_bank_questions(material, topic, difficulty, "mcq", count, exclude_ids)
+            banked = [_bank_question(r) for r in rows]
+        except Exception:
+            banked = []
+
+    need = count - len(banked)
+    if need <= 0:
+        return jsonify({
+            "ok": True, "source": "bank", "saved_ids": [],
+            "bank_ids": [q["id"] for q in banked], "questions": banked
+        })
+
+    prompt = build_prompt(material, topic, difficulty, need)
 
     used_source = "fallback"
       
     try:
-        payload = try_ollama_generate(prompt)
-        questions = normalize_questions(payload)
+        payload = try_ollama_generate(
+            prompt,
+            timeout_sec=min(60, max(MIN_ATTEMPT_SEC, _request_deadline(body) - time.monotonic())),
+            stop_after=need,
+            use_cache=bool(use_cache)
+        )
+        questions = _drop_near_dups(normalize_questions(payload), prior=banked)
         if not questions:
             raise ValueError("No questions returned")
         used_source = "ollama"
     except Exception:
-        questions = normalize_questions(fallback_questions(material, topic, difficulty, count))
+        questions = normalize_questions(fallback_questions(material, topic, difficulty, need))
 
 
 
-    ids = save_questions(material, topic, difficulty, questions, used_source)
-    return jsonify({"ok": True, "source": used_source, "saved_ids": ids, "questions": questions})
+    if _wants_write_behind(body):
+        save_questions_async(material, topic, difficulty, questions, used_source)
+        resp = {"ok": True, "source": used_source, "saved_ids": [], "save_queued": True, "questions": banked + questions}
+    else:
+        ids, existing_ids = save_questions(material, topic, difficulty, questions, used_source)
+        resp = {
+            "ok": True, "source": used_source, "saved_ids": ids,
+            "existing_ids": existing_ids, "questions": banked + questions
+        }
+    if use_bank:
+        resp["bank_ids"] = [q["id"] for q in banked]
+    return jsonify(resp)
 
 
 # ===== API: Health =====
@@ -386,7 +881,17 @@ def api_health():
         "ok": True,
         "use_ollama": USE_OLLAMA,
         "ollama_url": OLLAMA_URL,
-        "model": OLLAMA_MODEL
+        "model": OLLAMA_MODEL,
+        "ollama_client": ollama.stats(),
+        "json_salvage": salvage_stats.stats(),
+        "generation_cache": gen_cache.stats(),
+        "generation_coalescing": gen_flights.stats(),
+        "spare_pool": spare_pool.stats(),
+        "prewarm": prewarmer.stats(),
+        "near_dup": {"enabled": NEAR_DUP, "threshold": NEAR_DUP_THRESHOLD, **near_dup_stats.stats()},
+        "seen_store": seen_store.stats(),
+        "pdf_extract": pdf_extractor.stats(),
+        "pdf_jobs": pdf_jobs.stats()
     })
 
 # ===== API: Materials =====
@@ -468,7 +973,25 @@ VOCAB_BY_GRADE = {
     ],
 }
 
-SUPPORTED_TYPES = {"mcq", "reading_mcq", "tf", "fill", "reorder"}
+SUPPORTED_TYPES = set(QUESTION_SCHEMAS)  # mcq, reading_mcq, tf, fill, reorder
+
+# ===== Request time budget (keep under the load balancer's 60s idle timeout) =====
+GENERATION_MAX_SEC = float(os.getenv("GENERATION_MAX_SEC", "55"))
+MIN_ATTEMPT_SEC = float(os.getenv("GENERATION_MIN_ATTEMPT_SEC", "2"))
+
+def _request_deadline(data: Dict[str, Any]) -> float:
+    """
+    Absolute deadline (time.monotonic) for one request:
+    client `deadlineMs` if given, never more than GENERATION_MAX_SEC.
+    """
+    budget = GENERATION_MAX_SEC
+    try:
+        ms = float(data.get("deadlineMs") or 0)
+    except Exception:
+        ms = 0
+    if ms > 0:
+        budget = min(budget, ms / 1000.0)
+    return time.monotonic() + budget
 
 def _now_id() -> int:
     return int(time.time() * 1000) + random.randint(0, 999)
@@ -524,6 +1047,10 @@ def _extract_json(text: str) -> Optional[Any]:
         return None
 
 def _validate_one(q: Any) -> Optional[Dict[str, Any]]:
+    """
+    Coerce common model slips ("2" -> 2, "true" -> True, str ids),
+    then check the result against QUESTION_SCHEMAS[type].
+    """
     if not isinstance(q, dict):
         return None
 
@@ -531,76 +1058,81 @@ def _validate_one(q: Any) -> Optional[Dict[str, Any]]:
     if qtype not in SUPPORTED_TYPES:
         return None
 
-    qid = q.get("id") or _now_id()
-    question = str(q.get("question", "")).strip()
-    if not question:
-        return None
+    try:
+        qid = int(q.get("id") or _now_id())
+    except Exception:
+        qid = _now_id()
 
-    out = {"id": int(qid), "type": qtype, "question": question}
+    out = {"id": qid, "type": qtype, "question": str(q.get("question", "")).strip()}
 
     if qtype == "reading_mcq":
-        passage = str(q.get("passage", "")).strip()
-        if not passage:
-            return None
-        out["passage"] = passage
+        out["passage"] = str(q.get("passage", "")).strip()
 
     if qtype in ("mcq", "reading_mcq"):
         choices = q.get("choices")
-        correct = q.get("correctIndex")
-        if not isinstance(choices, list) or len(choices) != 4:
-            return None
+        out["choices"] = [str(c) for c in choices] if isinstance(choices, list) else choices
         try:
-            correct = int(correct)
+            out["correctIndex"] = int(q.get("correctIndex"))
         except Exception:
             return None
-        if correct < 0 or correct > 3:
-            return None
-        out["choices"] = [str(c) for c in choices]
-        out["correctIndex"] = correct
-        return out
 
-    if qtype == "tf":
+    elif qtype == "tf":
         ans = q.get("answer")
-        if isinstance(ans, bool):
-            out["answer"] = ans
-        else:
+        if not isinstance(ans, bool):
             s = str(ans).strip().lower()
             if s in ("true", "1", "yes"):
-                out["answer"] = True
+                ans = True
             elif s in ("false", "0", "no"):
-                out["answer"] = False
+                ans = False
             else:
                 return None
-        return out
-
-    if qtype == "fill":
-        ans = str(q.get("answer", "")).strip()
-        if not ans:
-            return None
         out["answer"] = ans
-        return out
 
-    if qtype == "reorder":
+    elif qtype == "fill":
+        out["answer"] = str(q.get("answer", "")).strip()
+
+    elif qtype == "reorder":
         words = q.get("words")
-        ans = str(q.get("answer", "")).strip()
-        if not isinstance(words, list) or len(words) < 3:
-            return None
-        if not ans:
-            return None
-        out["words"] = [str(w) for w in words]
-        out["answer"] = ans
-        return out
+        out["words"] = [str(w) for w in words] if isinstance(words, list) else words
+        out["answer"] = str(q.get("answer", "")).strip()
 
-    return None
+    if not matches(QUESTION_SCHEMAS[qtype], out):
+        return None
+    return out
 
-def _dedupe(qs: List[Dict[str, Any]], seen: set) -> List[Dict[str, Any]]:
+def _stem(q: Dict[str, Any]) -> str:
+    return (_norm(q.get("question", "")) + " " + _norm(q.get("passage", ""))).strip()[:120]
+
+# Exact-duplicate memory for _dedupe: a set for requests, a Bloom filter for bulk runs
+# (a set of 40-char sha1 hex strings costs ~120 bytes per question, the filter 2-4 bytes, see benchmarks/bench_dedupe.py)
+SeenSet = Union[set, ScalableBloomFilter]
+DEDUPE_BLOOM_ABOVE = int(os.getenv("DEDUPE_BLOOM_ABOVE", "10000"))
+DEDUPE_BLOOM_ERROR_RATE = float(os.getenv("DEDUPE_BLOOM_ERROR_RATE", "0.001"))
+
+def _new_seen(expected: int = 0) -> SeenSet:
+    """Fingerprint memory for about `expected` questions; a Bloom filter past DEDUPE_BLOOM_ABOVE."""
+    if expected > DEDUPE_BLOOM_ABOVE:
+        return ScalableBloomFilter(initial_capacity=expected, error_rate=DEDUPE_BLOOM_ERROR_RATE)
+    return set()
+
+def _dedupe(qs: List[Dict[str, Any]], seen: SeenSet, near: Optional[LshIndex] = None) -> List[Dict[str, Any]]:
+    """
+    Drop exact repeats (fingerprints in `seen`) and, if `near` is given, near-duplicates.
+    With a Bloom filter as `seen`, about DEDUPE_BLOOM_ERROR_RATE of new questions are dropped as false repeats.
+    """
     out = []
+    near_dropped = 0
     for q in qs:
         fp = _fingerprint(q)
         if fp in seen:
             continue
         seen.add(fp)
+        if near is not None and _is_near_dup(q, near):
+            near_dropped += 1
+            continue
         out.append(q)
+    if near is not None:
+        near_dup_stats.record(len(qs), in_request=near_dropped)
     return out
 
 def _mock_generate_batch(
@@ -697,8 +1229,13 @@ def _mock_generate_batch(
 
 def _ollama_generate_batch(
     grade: int, skill: str, difficulty: str, types: List[str], count: int,
-    unit_text: str, material: str, avoid_stems: List[str]
+    unit_text: str, material: str, avoid_stems: List[str], timeout_sec: float = 120,
+    stop_after: Optional[int] = None, seen: Optional[SeenSet] = None
 ) -> List[Dict[str, Any]]:
+    """
+    With OLLAMA_STREAM, questions are validated as they stream in and the
+    generation is cancelled once `stop_after` new (not in `seen`) ones arrived.
+    """
     context = (unit_text or "").strip()
     if context:
         context = context[:4500]
@@ -759,6 +1296,7 @@ Avoid these stems (do not repeat them):
         "model": OLLAMA_MODEL,
         "prompt": prompt,
         "stream": False,
+        "format": batch_format(types) if OLLAMA_FORMAT_SCHEMA else "json",
         "options": {
             "temperature": OLLAMA_TEMPERATURE,
             "top_p": OLLAMA_TOP_P,
@@ -766,13 +1304,31 @@ Avoid these stems (do not repeat them):
         }
     }
 
-    r = requests.post(OLLAMA_URL, json=payload, timeout=120)
-    r.raise_for_status()
-    text = r.json().get("response", "")
+    if OLLAMA_STREAM:
+        cleaned: List[Dict[str, Any]] = []
+        fresh = set()
+        got_any = False
+        with closing(_ollama_stream_items(payload, timeout_sec)) as stream:
+            for item in stream:
+                got_any = True
+                q = _validate_one(item)
+                if not q:
+                    continue
+                cleaned.append(q)
+                fp = _fingerprint(q)
+                if not seen or fp not in seen:
+                    fresh.add(fp)
+                if stop_after and len(fresh) >= stop_after:
+                    break
+        if not got_any:
+            raise ValueError("Model did not return valid JSON")
+        return cleaned
+
+    text = ollama.generate(payload, read_timeout=timeout_sec).get("response", "")
 
     raw = _extract_json(text)
     if raw is None:
-        raise ValueError("Model did not return valid JSON")
+        raw = _salvage_or_raise(text, "Model did not return valid JSON")
     if not isinstance(raw, list):
         raise ValueError("Invalid JSON: questions must be an array")
 
@@ -784,99 +1340,488 @@ Avoid these stems (do not repeat them):
 
     return cleaned
 
+# ===== Spare pool: surplus from over-generation, served by /api/regenerate-question =====
+spare_pool = SparePool(
+    max_keys=int(os.getenv("SPARE_POOL_MAX_KEYS", "500")),
+    per_key=int(os.getenv("SPARE_POOL_PER_KEY", "50")),
+    max_age_sec=float(os.getenv("SPARE_POOL_MAX_AGE_SEC", str(6 * 3600))),
+)
+# a streamed batch stops once `need` questions arrived; while a pool key has room,
+# read this many more so there is surplus to keep
+SPARE_POOL_MARGIN = max(0, int(os.getenv("SPARE_POOL_MARGIN", "5")))
+
+def _pool_key(grade: int, skill: str, difficulty: str, qtype: str, material: str, unit_text: str) -> Tuple:
+    unit_hash = hashlib.sha1((unit_text or "").strip().encode("utf-8")).hexdigest()
+    return (grade, skill, difficulty, qtype, material, unit_hash)
+
+def _stash_spares(
+    grade: int, skill: str, difficulty: str, material: str, unit_text: str, qs: List[Dict[str, Any]]
+):
+    by_type: Dict[str, List[Dict[str, Any]]] = {}
+    for q in qs:
+        by_type.setdefault(q["type"], []).append(q)
+    for qtype, items in by_type.items():
+        spare_pool.add(_pool_key(grade, skill, difficulty, qtype, material, unit_text), items)
+
+# ===== Seen store: per session/class "already served" stems, kept server-side =====
+seen_store = SeenStore(
+    max_sessions=int(os.getenv("SEEN_STORE_MAX_SESSIONS", "5000")),
+    capacity=int(os.getenv("SEEN_STORE_CAPACITY", "5000")),
+    error_rate=float(os.getenv("SEEN_STORE_ERROR_RATE", "0.01")),
+    ttl_sec=float(os.getenv("SEEN_STORE_TTL_SEC", str(7 * 24 * 3600))),
+)
+
+def _seen_session(data: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    -> (id to send back, id to record seen stems under).
+    A request without the client's `session` id (a browser session or a class) gets a new id,
+    but nothing is recorded for it until it comes back: one-shot callers would otherwise
+    fill the store with filters and evict real sessions.
+    """
+    session = str(data.get("session") or "").strip()[:100]
+    return (session, session) if session else (_new_id("seen"), "")
+
+def _legacy_avoid(data: Dict[str, Any]) -> set:
+    """Stems from the old client-sent `avoid` list; only used to filter, never sent to the model."""
+    avoid = data.get("avoid", [])
+    if not isinstance(avoid, list):
+        return set()
+    return {s for s in (_norm(str(x))[:120] for x in avoid) if s}
+
+# ===== Sharded generation: several small prompts in parallel instead of one huge one =====
+GENERATION_SHARDED = os.getenv("GENERATION_SHARDED", "0") == "1"
+GENERATION_SHARD_SIZE = max(1, int(os.getenv("GENERATION_SHARD_SIZE", "10")))
+# largest batch _iter_generate asks for in one round
+GENERATION_MAX_BATCH = 60
+# default: enough workers to run every shard of the largest batch at once (one round)
+GENERATION_SHARD_CONCURRENCY = max(1, int(os.getenv(
+    "GENERATION_SHARD_CONCURRENCY", str(-(-GENERATION_MAX_BATCH // GENERATION_SHARD_SIZE))
+)))
+
+_shard_pool = ThreadPoolExecutor(max_workers=GENERATION_SHARD_CONCURRENCY, thread_name_prefix="gen-shard")
+
+def _generate_one_batch(
+    grade: int, skill: str, difficulty: str, types: List[str], count: int,
+    unit_text: str, material: str, avoid_stems: List[str], timeout_sec: float,
+    stop_after: Optional[int] = None, seen: Optional[SeenSet] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One Ollama (or mock) batch; on any error fall back to mock + warning."""
+    if USE_OLLAMA and not ollama.available():
+        # breaker open: don't build the prompt or take a pool slot just to fail
+        warning = "AI fallback used: Ollama circuit breaker is open"
+        return _mock_generate_batch(grade, skill, difficulty, types, count, material), warning
+    try:
+        if USE_OLLAMA:
+            batch = _ollama_generate_batch(
+                grade=grade, skill=skill, difficulty=difficulty,
+                types=types, count=count,
+                unit_text=unit_text, material=material,
+                avoid_stems=avoid_stems, timeout_sec=timeout_sec,
+                stop_after=stop_after, seen=seen
+            )
+        else:
+            batch = _mock_generate_batch(
+                grade=grade, skill=skill, difficulty=difficulty,
+                types=types, count=count, material=material
+            )
+        return batch, None
+    except Exception as e:
+        warning = f"AI fallback used: {e.__class__.__name__}: {e}"
+        return _mock_generate_batch(grade, skill, difficulty, types, count, material), warning
+
+def _run_shard(
+    deadline: float, grade: int, skill: str, difficulty: str, types: List[str], count: int,
+    unit_text: str, material: str, avoid_stems: List[str],
+    stop_after: Optional[int], seen: Optional[SeenSet]
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One shard; its timeout is what is left of the request budget when it actually starts."""
+    remaining = deadline - time.monotonic()
+    if remaining < MIN_ATTEMPT_SEC:
+        return [], None  # queued behind other requests' shards until the budget was gone
+    return _generate_one_batch(
+        grade, skill, difficulty, types, count, unit_text, material, avoid_stems,
+        min(120, remaining), stop_after, seen
+    )
+
+def _generate_sharded(
+    grade: int, skill: str, difficulty: str, types: List[str], count: int,
+    unit_text: str, material: str, avoid_stems: List[str], deadline: float,
+    stop_after: Optional[int] = None, seen: Optional[SeenSet] = None,
+    shard_size: int = GENERATION_SHARD_SIZE
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Split `count` into shards of `shard_size`, run them on the bounded shard pool
+    and merge in shard order (caller dedupes). Every shard is bounded by the absolute
+    `deadline`; shards still queued when it passes are cancelled.
+    """
+    sizes = [shard_size] * (count // shard_size)
+    if count % shard_size:
+        sizes.append(count % shard_size)
+
+    futures = [
+        _shard_pool.submit(
+            _run_shard, deadline, grade, skill, difficulty, types, n,
+            unit_text, material, avoid_stems,
+            # each shard may stop at its share of what is still needed
+            (stop_after * n + count - 1) // count if stop_after else None, seen
+        )
+        for n in sizes
+    ]
+
+    merged: List[Dict[str, Any]] = []
+    warning = None
+    ids = set()
+    for f in futures:
+        if time.monotonic() >= deadline:
+            f.cancel()  # no-op once running; a running shard ends by its own timeout
+        if f.cancelled():
+            continue
+        batch, w = f.result()
+        warning = warning or w
+        for q in batch:
+            # every shard numbers its questions 1..n
+            if not isinstance(q, dict):
+                continue
+            while q.get("id") in ids:
+                q["id"] = _now_id()
+            ids.add(q.get("id"))
+            merged.append(q)
+    return merged, warning
+
+def _default_types(skill: str) -> List[str]:
+    if skill == "reading":
+        return ["reading_mcq"]
+    if skill == "grammar":
+        return ["mcq", "fill", "tf", "reorder"]
+    return ["mcq", "fill", "tf"]
+
+# ===== Pre-warming: keep stock for the hot (grade, skill, difficulty, type) cells =====
+PREWARM = os.getenv("PREWARM", "0") == "1"
+PREWARM_SKILLS = ["vocabulary", "grammar", "reading"]
+PREWARM_DIFFICULTIES = ["easy", "medium", "hard"]
+# stock is per material (pool keys include it); "" is the no-material cell. Requests with unit text never hit.
+PREWARM_MATERIALS = [""] + [m.strip() for m in os.getenv("PREWARM_MATERIALS", "").split(",") if m.strip()]
+# only use idle capacity: skip refills while this many Ollama calls are running
+PREWARM_MAX_IN_FLIGHT = int(os.getenv("PREWARM_MAX_IN_FLIGHT", "1"))
+
+def _prewarm_fill(cell: Tuple, n: int) -> List[Dict[str, Any]]:
+    grade, skill, difficulty, qtype, material = cell
+    batch, w = _generate_one_batch(grade, skill, difficulty, [qtype], n, "", material, [], 120)
+    if w:
+        return []  # never stock mock fallbacks
+    return _dedupe([v for v in (_validate_one(q) for q in batch) if v], _new_seen(n), _near_index())
+
+prewarmer = Prewarmer(
+    spare_pool,
+    cells=[
+        (_pool_key(g, sk, d, t, m, ""), (g, sk, d, t, m))
+        for m in PREWARM_MATERIALS
+        for g in sorted(VOCAB_BY_GRADE)
+        for sk in PREWARM_SKILLS
+        for d in PREWARM_DIFFICULTIES
+        for t in _default_types(sk)
+    ],
+    fill=_prewarm_fill,
+    target=int(os.getenv("PREWARM_TARGET", "20")),
+    low_water=int(os.getenv("PREWARM_LOW_WATER", "5")),
+    concurrency=int(os.getenv("PREWARM_CONCURRENCY", "1")),
+    interval_sec=float(os.getenv("PREWARM_INTERVAL_SEC", "10")),
+    can_run=lambda: not ollama.breaker.is_open() and ollama.stats()["in_flight"] < PREWARM_MAX_IN_FLIGHT,
+)
+if PREWARM and USE_OLLAMA and multiprocessing.current_process().name == "MainProcess":  # not in PDF workers
+    prewarmer.start()
+
 def _generate_with_retry(
     grade: int, skill: str, difficulty: str, count: int,
     types: List[str], unit_text: str, material: str,
-    pool_multiplier: int, avoid_from_client: List[str]
+    pool_multiplier: int, avoid_stems: set, session: str = "",
+    deadline: Optional[float] = None, sharded: bool = False
 ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
-    seen = set()
-    out: List[Dict[str, Any]] = []
-
-    # types default
-    if not types:
-        if skill == "reading":
-            types = ["reading_mcq"]
-        elif skill == "grammar":
-            types = ["mcq", "fill", "tf", "reorder"]
+    final: List[Dict[str, Any]] = []
+    warning = None
+    for kind, item in _iter_generate(
+        grade, skill, difficulty, count, types, unit_text, material,
+        pool_multiplier, avoid_stems, session, deadline, sharded
+    ):
+        if kind == "question":
+            final.append(item)
         else:
-            types = ["mcq", "fill", "tf"]
+            warning = item
+    return final, warning
+
+def _iter_generate(
+    grade: int, skill: str, difficulty: str, count: int,
+    types: List[str], unit_text: str, material: str,
+    pool_multiplier: int, avoid_stems: set, session: str = "",
+    deadline: Optional[float] = None, sharded: bool = False
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Yields ("question", q) as soon as q passes _validate_one + _dedupe and was not
+    seen before by `session` (seen_store) or listed in `avoid_stems`,
+    then exactly one ("done", warning_or_None). Every yielded question is recorded as seen.
+    """
+    seen = _new_seen(count)
+    near = _near_index()
+    out: List[Dict[str, Any]] = []
 
-    types = [t for t in types if t in SUPPORTED_TYPES]
+    types = [t for t in (types or _default_types(skill)) if t in SUPPORTED_TYPES]
     if not types:
         types = ["mcq"]
 
+    def is_seen(q: Dict[str, Any]) -> bool:
+        stem = _stem(q)
+        return bool(stem) and (stem in avoid_stems or seen_store.seen(session, stem))
+
+    def serve(q: Dict[str, Any]):
+        out.append(q)
+        seen_store.add(session, [_stem(q)])
+        return "question", q
+
+    # pre-generated stock / spares first, the model only fills the rest
+    per_type = -(-count // len(types))
+    for t in types:
+        need = min(per_type, count - len(out))
+        if need <= 0:
+            break
+        key = _pool_key(grade, skill, difficulty, t, material, unit_text)
+        stocked = spare_pool.take(key, need, reject=is_seen)
+        from_stock = 0
+        for q in _dedupe(stocked, seen, near):
+            from_stock += 1
+            yield serve({**q, "id": _now_id()})
+        prewarmer.record(key, need, from_stock)
+
     pool_multiplier = max(1, min(6, int(pool_multiplier or 3)))
     max_attempts = 6
     warning = None
+    if deadline is None:
+        deadline = time.monotonic() + GENERATION_MAX_SEC
+    timed_out = False
 
     for attempt in range(max_attempts):
         need = count - len(out)
         if need <= 0:
             break
 
-        # generate more to survive filtering
-        batch_n = min(60, max(need, int(need * (1.2 + 0.4 * pool_multiplier))))
-
-        # avoid stems from already generated + from client (regenerate/preview)
-        avoid_stems = [(_norm(q.get("question", "")) + " " + _norm(q.get("passage", ""))).strip() for q in out]
-        avoid_stems = [s[:120] for s in avoid_stems if s]
-
-        client_avoid = [(_norm(x)[:120]) for x in (avoid_from_client or []) if _norm(x)]
-        avoid_stems = (client_avoid + avoid_stems)[:40]
-
-        try:
-            if USE_OLLAMA:
-                batch = _ollama_generate_batch(
-                    grade=grade, skill=skill, difficulty=difficulty,
-                    types=types, count=batch_n,
-                    unit_text=unit_text, material=material,
-                    avoid_stems=avoid_stems
-                )
-            else:
-                batch = _mock_generate_batch(
-                    grade=grade, skill=skill, difficulty=difficulty,
-                    types=types, count=batch_n, material=material
-                )
-        except Exception as e:
-            warning = f"AI fallback used: {e.__class__.__name__}: {e}"
-            batch = _mock_generate_batch(grade, skill, difficulty, types, batch_n, material)
-
-        batch = [q for q in batch if q]
-        batch = _dedupe(batch, seen)
-        out.extend(batch)
-
-        if len(out) > count:
-            out = out[:count]
-
-    # final validate
-    final: List[Dict[str, Any]] = []
-    for q in out:
-        v = _validate_one(q)
-        if v:
-            final.append(v)
-    final = final[:count]
+        # each attempt only gets what is left of the request budget
+        remaining = deadline - time.monotonic()
+        if remaining < MIN_ATTEMPT_SEC:
+            timed_out = True
+            break
 
-    if len(final) < count:
+        # generate more to survive filtering
+        batch_n = min(GENERATION_MAX_BATCH, max(need, int(need * (1.2 + 0.4 * pool_multiplier))))
+
+        # only this request's own stems go into the prompt; seen/avoided ones are filtered below
+        prompt_avoid = [s for s in (_stem(q) for q in out) if s][:40]
+
+        stop_after = need
+        if USE_OLLAMA and any(
+            spare_pool.size(_pool_key(grade, skill, difficulty, t, material, unit_text)) < spare_pool.per_key
+            for t in types
+        ):
+            stop_after = min(batch_n, need + SPARE_POOL_MARGIN)
+
+        if sharded:
+            batch, w = _generate_sharded(
+                grade, skill, difficulty, types, batch_n,
+                unit_text, material, prompt_avoid, deadline,
+                stop_after=stop_after, seen=seen
+            )
+        else:
+            batch, w = _generate_one_batch(
+                grade, skill, difficulty, types, batch_n,
+                unit_text, material, prompt_avoid, min(120, remaining),
+                stop_after=stop_after, seen=seen
+            )
+        warning = w or warning
+
+        batch = [v for v in (_validate_one(q) for q in batch) if v]
+        # mock fallbacks are template-made and near-duplicates by design
+        batch = _dedupe(batch, seen, None if w else near)
+        fresh = [q for q in batch if not is_seen(q)][:need]
+        for q in fresh:
+            yield serve(q)
+
+        # keep real (non-fallback) surplus for regenerate instead of throwing it away
+        # (questions this session has seen are still new to others)
+        if USE_OLLAMA and not w:
+            served = {id(q) for q in fresh}
+            _stash_spares(grade, skill, difficulty, material, unit_text, [q for q in batch if id(q) not in served])
+
+    if timed_out and len(out) < count:
+        warning = f"Time budget reached: returning {len(out)} of {count} questions."
+    elif len(out) < count:
         warning = warning or "Could not reach full count without duplicates; enable Ollama for best results."
 
-    return final, warning
+    yield "done", warning
 
 @app.get("/health")
 def health():
-    return jsonify(status="ok", use_ollama=USE_OLLAMA, model=OLLAMA_MODEL)
+    return jsonify(status="ok", use_ollama=USE_OLLAMA, model=OLLAMA_MODEL,
+                   ollama_breaker=ollama.breaker.stats()["state"])
+
+# ===== PDF import =====
+PDF_MAX_CHARS = int(os.getenv("PDF_MAX_CHARS", "50000"))
+# pdf_extract.BACKENDS: "pdfplumber" (layout-aware) or "plain" (words only, much faster);
+# `backend=` picks one per request, `fast=1` picks PDF_FAST_BACKEND
+PDF_BACKEND = os.getenv("PDF_BACKEND", "pdfplumber")
+PDF_FAST_BACKEND = os.getenv("PDF_FAST_BACKEND", "plain")
+# large uploads are parsed on a process pool (PDF_WORKERS=1 keeps everything on the request thread)
+pdf_extractor = ParallelExtractor(
+    workers=int(os.getenv("PDF_WORKERS", "0")),
+    min_bytes=int(os.getenv("PDF_PARALLEL_MIN_BYTES", str(2 * 1024 * 1024))),
+    chunk_pages=int(os.getenv("PDF_CHUNK_PAGES", "8")),
+)
+
+
+# extracted text by sha256 of the upload; PDF_CACHE_MAX_BYTES=0 turns it off
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+pdf_cache = PdfTextCache(os.path.join(DATA_DIR, "pdf_cache"), PDF_CACHE_MAX_BYTES) if PDF_CACHE_MAX_BYTES > 0 else None
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+PDF_JOB_TTL_SEC = float(os.getenv("PDF_JOB_TTL_SEC", "3600"))
+pdf_jobs = ImportJobs(
+    workers=int(os.getenv("PDF_JOB_WORKERS", "2")),
+    ttl_sec=PDF_JOB_TTL_SEC,
+    max_jobs=int(os.getenv("PDF_JOB_MAX", "200")),
+)
+
+
+def _extract_pdf(
+    path: str, digest: str, pages: str, max_chars: int, backend: str, sink: Dict[int, str],
+) -> Dict[str, Any]:
+    """Cached text if the cache can answer, else parse the spooled upload (filling `sink` page by page)."""
+    result = pdf_cache.lookup(digest, pages, max_chars, backend) if pdf_cache else None
+    if result is not None:
+        return {**result, "backend": backend, "cached": True}
+    result = pdf_extractor.extract(path, pages, max_chars, sink=sink, backend=backend)
+    if pdf_cache and result["total_pages"]:
+        pdf_cache.put(digest, result["total_pages"], sink, backend)
+    return {**result, "backend": backend, "cached": False}
+
+
+def _remove(path: str):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
 
 @app.post("/api/import/pdf")
 def import_pdf():
+    """
+    Extract the text of an uploaded PDF. With `?async=1` the upload is queued as a
+    background job and 202 + job id is returned; poll GET /api/import/pdf/jobs/<id>.
+    `fast=1` (or `backend=plain`) skips layout analysis when only the words are needed.
+    """
     if "file" not in request.files:
         return jsonify({"error": "no file"}), 400
 
-    f = request.files["file"]
-    text = ""
-    with pdfplumber.open(f) as pdf:
-        for page in pdf.pages:
-            text += (page.extract_text() or "") + "\n"
+    args = request.values
+    try:
+        max_chars = min(PDF_MAX_CHARS, max(1, int(args.get("maxChars") or PDF_MAX_CHARS)))
+        pages = args.get("pages", "")
+        parse_page_ranges(pages)
+        backend = args.get("backend") or (PDF_FAST_BACKEND if args.get("fast") in ("1", "true") else PDF_BACKEND)
+        if backend not in PDF_BACKENDS:
+            raise ValueError(f"unknown PDF backend {backend!r} (one of: {', '.join(PDF_BACKENDS)})")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    path, digest = spool_upload(request.files["file"].stream)
+    if args.get("async") not in ("1", "true"):
+        try:
+            return jsonify(_extract_pdf(path, digest, pages, max_chars, backend, {}))
+        except PDF_ERRORS:
+            return jsonify({"error": "not a readable PDF"}), 400
+        finally:
+            _remove(path)
 
-    return jsonify({"text": text[:50000]})
+    try:
+        with pdfplumber.open(path) as pdf:
+            total = page_count(pdf)
+    except Exception:
+        _remove(path)
+        return jsonify({"error": "not a readable PDF"}), 400
+    try:
+        job_id = pdf_jobs.submit(
+            lambda sink: _extract_pdf(path, digest, pages, max_chars, backend, sink),
+            total_pages=total,
+            cleanup=lambda: _remove(path),
+        )
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify({
+        "job": job_id,
+        "status": "queued",
+        "total_pages": total,
+        "poll": f"/api/import/pdf/jobs/{job_id}",
+    }), 202
+
+
+@app.get("/api/import/pdf/jobs/<job_id>")
+def import_pdf_job(job_id):
+    snap = pdf_jobs.snapshot(job_id, PDF_MAX_CHARS)
+    if snap is None:
+        return jsonify({"error": "unknown or expired job"}), 404
+    return jsonify(snap)
+
+
+def _admin_ok() -> bool:
+    # admin endpoints are off unless ADMIN_TOKEN is set (CORS is open to any origin)
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(request.headers.get("X-Admin-Token", ""), ADMIN_TOKEN)
+
+
+@app.get("/api/admin/pdf-cache")
+def pdf_cache_stats():
+    if not _admin_ok():
+        return jsonify({"error": "forbidden"}), 403
+    return jsonify({"enabled": pdf_cache is not None, **(pdf_cache.stats() if pdf_cache else {})})
+
+
+@app.delete("/api/admin/pdf-cache")
+def pdf_cache_purge():
+    """Drop every cached document, or only `?key=<sha256>`."""
+    if not _admin_ok():
+        return jsonify({"error": "forbidden"}), 403
+    key = request.args.get("key", "")
+    if key and not PdfTextCache.valid_key(key):
+        return jsonify({"error": "key must be a sha256 hex digest"}), 400
+    removed = pdf_cache.purge(key or None) if pdf_cache else 0
+    return jsonify({"removed": removed})
+
+def _stream_questions(
+    events: Iterator[Tuple[str, Any]], mimetype: str, done_extra: Optional[Dict[str, Any]] = None
+) -> Response:
+    """
+    application/x-ndjson: {"event": "question", "question": {...}} per line
+    text/event-stream:    event: question / data: {...}
+    Last event is "done" with {"count": n, "warning": ..., **done_extra}.
+    """
+    def encode(event: str, payload: Dict[str, Any]) -> str:
+        if mimetype == "text/event-stream":
+            return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+        return json.dumps({"event": event, **payload}, ensure_ascii=False) + "\n"
+
+    def gen():
+        n = 0
+        for kind, item in events:
+            if kind == "question":
+                n += 1
+                yield encode("question", {"question": item})
+            else:
+                done = {"count": n, **(done_extra or {})}
+                if item:
+                    done["warning"] = item
+                yield encode("done", done)
+
+    return Response(
+        stream_with_context(gen()),
+        mimetype=mimetype,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.post("/api/generate-questions")
 def generate_questions():
@@ -891,10 +1836,7 @@ def generate_questions():
     material = str(data.get("material", "")).strip()
     pool_multiplier = int(data.get("poolMultiplier", 3))
 
-    avoid_from_client = data.get("avoid", [])
-    if not isinstance(avoid_from_client, list):
-        avoid_from_client = []
-    avoid_from_client = [str(x) for x in avoid_from_client if str(x).strip()]
+    session, seen_session = _seen_session(data)
 
     types = data.get("types", None)
     if isinstance(types, list):
@@ -902,14 +1844,28 @@ def generate_questions():
     else:
         types = []
 
-    qs, warning = _generate_with_retry(
+    sharded = data.get("sharded", GENERATION_SHARDED)
+    if isinstance(sharded, str):
+        sharded = sharded.strip().lower() not in ("0", "false", "no")
+
+    gen_args = dict(
         grade=grade, skill=skill, difficulty=difficulty,
         count=count, types=types, unit_text=unit_text,
         material=material, pool_multiplier=pool_multiplier,
-        avoid_from_client=avoid_from_client
+        avoid_stems=_legacy_avoid(data), session=seen_session,
+        deadline=_request_deadline(data), sharded=bool(sharded)
     )
 
-    resp = {"questions": qs}
+    # opt-in streaming: one event per question as soon as it is ready, then a summary
+    stream_type = request.accept_mimetypes.best_match(
+        ["application/json", "application/x-ndjson", "text/event-stream"]
+    )
+    if stream_type in ("application/x-ndjson", "text/event-stream"):
+        return _stream_questions(_iter_generate(**gen_args), stream_type, {"session": session})
+
+    qs, warning = _generate_with_retry(**gen_args)
+
+    resp = {"questions": qs, "session": session}
     if warning:
         resp["warning"] = warning
     return jsonify(resp)
@@ -928,29 +1884,49 @@ def regenerate_question():
     if qtype not in SUPPORTED_TYPES:
         qtype = "mcq"
 
-    avoid = data.get("avoid", [])
-    if not isinstance(avoid, list):
-        avoid = []
-    avoid = [str(x)[:120] for x in avoid if str(x).strip()]
+    session, seen_session = _seen_session(data)
+    avoid_stems = _legacy_avoid(data)
+
+    def is_avoided(q: Dict[str, Any]) -> bool:
+        stem = _stem(q)
+        return bool(stem) and (stem in avoid_stems or seen_store.seen(seen_session, stem))
+
+    def served(q: Dict[str, Any]):
+        seen_store.add(seen_session, [_stem(q)])
+        return jsonify({"question": q, "session": session})
 
+    # surplus from earlier generations first: no model round trip
+    key = _pool_key(grade, skill, difficulty, qtype, material, unit_text)
+    spare = spare_pool.pop(key, reject=is_avoided)
+    if spare:
+        return served({**spare, "id": _now_id()})
+
+    from_model = False
     try:
-        if USE_OLLAMA:
-            batch = _ollama_generate_batch(grade, skill, difficulty, [qtype], 10, unit_text, material, avoid)
+        if USE_OLLAMA and ollama.available():
+            timeout_sec = min(120, max(MIN_ATTEMPT_SEC, _request_deadline(data) - time.monotonic()))
+            batch = _ollama_generate_batch(grade, skill, difficulty, [qtype], 10, unit_text, material, [], timeout_sec)
+            from_model = True
         else:
             batch = _mock_generate_batch(grade, skill, difficulty, [qtype], 10, material)
     except Exception:
         batch = _mock_generate_batch(grade, skill, difficulty, [qtype], 10, material)
 
-    for item in batch:
-        v = _validate_one(item)
-        if not v:
-            continue
-        stem = (_norm(v.get("question", "")) + " " + _norm(v.get("passage", ""))).strip()[:120]
-        if stem and stem in [ _norm(x)[:120] for x in avoid ]:
-            continue
-        return jsonify({"question": v})
+    picked = None
+    rest: List[Dict[str, Any]] = []
+    valid = [v for v in (_validate_one(x) for x in batch) if v]
+    for item in _dedupe(valid, _new_seen(len(valid)), _near_index() if from_model else None):
+        if picked is None and not is_avoided(item):
+            picked = item
+        else:
+            rest.append(item)
+
+    if from_model:
+        spare_pool.add(key, rest)
+    if picked:
+        return served(picked)
 
-    return jsonify({"error": "Could not regenerate"}), 400
+    return jsonify({"error": "Could not regenerate", "session": session}), 400
 
 if __name__ == "__main__":
     app.run(host="127.0.0.1", port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,74 @@
+"""
+Exact-duplicate memory for bulk bank building: Python set of sha1 hex fingerprints
+(what _dedupe used) vs ScalableBloomFilter (bloom.py).
+
+    cd backend
+    python benchmarks/bench_dedupe.py                 # 10k, 100k, 1M fingerprints
+    python benchmarks/bench_dedupe.py 5000000         # custom sizes
+
+memory: bytes held by the structure, including the fingerprint strings a set keeps alive
+rate:   `if fp in seen: skip; seen.add(fp)` loop over new fingerprints (as in _dedupe)
+fp:     share of 100k never-added fingerprints reported as already seen
+"""
+import hashlib
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bloom import ScalableBloomFilter  # noqa: E402
+
+SIZES = [10_000, 100_000, 1_000_000]
+ERROR_RATE = 0.001
+PROBES = 100_000
+
+
+def _fp(i):
+    return hashlib.sha1(f"question {i}".encode()).hexdigest()
+
+
+def _fill(seen, n):
+    kept = 0
+    for i in range(n):
+        fp = _fp(i)
+        if fp in seen:
+            continue
+        seen.add(fp)
+        kept += 1
+    return kept
+
+
+def _make(name):
+    if name == "set":
+        return set()
+    return ScalableBloomFilter(initial_capacity=10_000, error_rate=ERROR_RATE)
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or SIZES
+    print(f"{'items':>9} | {'impl':<6} | {'memory':>10} | {'B/item':>7} | {'items/s':>9} | {'fp rate':>8}")
+    for n in sizes:
+        for name in ("set", "bloom"):
+            # memory (separate pass: tracemalloc slows everything down)
+            tracemalloc.start()
+            seen = _make(name)
+            _fill(seen, n)
+            mem = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del seen
+
+            seen = _make(name)
+            t = time.perf_counter()
+            _fill(seen, n)
+            rate = n / (time.perf_counter() - t)
+
+            fp_rate = sum(_fp(-1 - i) in seen for i in range(PROBES)) / PROBES
+            print(f"{n:>9} | {name:<6} | {mem / 1e6:>8.2f}MB | {mem / n:>7.1f} | {rate:>9.0f} | {fp_rate:>8.4f}")
+            if name == "bloom":
+                print(f"{'':>9} | {'':<6} | serialized {len(seen.to_bytes()) / 1e6:.2f}MB in {len(seen.filters)} filters")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Near-duplicate detection cost: MinHash signature, in-request LshIndex (100k keys) and
+the persisted per-material index (ai_question_lsh) with ROWS saved questions.
+
+    cd backend
+    python benchmarks/bench_near_dup.py                  # 100k rows, in-memory SQLite
+    python benchmarks/bench_near_dup.py 1000000          # 1M rows (takes a few minutes to fill)
+    DATABASE_URL=postgresql://... python benchmarks/bench_near_dup.py 1000000
+
+Filler rows get random signatures (unrelated questions); lookups use real question text.
+First it scores realistic pairs at NEAR_DUP_THRESHOLD: rewordings that should be caught
+and distinct template questions (same frame, different answer) that must never be.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import app as A  # noqa: E402
+from models import AiQuestion, AiQuestionLsh, db  # noqa: E402
+from near_dup import LshIndex, sig_to_bytes, similarity  # noqa: E402
+
+MATERIAL = "__bench_near_dup__"
+FILL_BATCH = 5000
+LOOKUPS = 200
+# the in-memory index only ever holds one request's questions; 100k is far above that
+MEMORY_KEYS = 100_000
+
+QUESTIONS = [
+    "She ___ to school every day.",
+    "What is the opposite of hot?",
+    "Choose the correct word: I ___ football yesterday.",
+    "My father ___ a doctor.",
+    "Which word is a verb?",
+]
+
+
+def _q(text, choices, answer):
+    return {"question": text, "choices": choices, "correctIndex": choices.index(answer)}
+
+
+# (a, b, should_match)
+PAIRS = [
+    (_q("She ___ to school every day.", ["go", "goes", "going", "gone"], "goes"),
+     _q("She ____ to school each day.", ["go", "goes", "going", "gone"], "goes"), True),
+    (_q("What is the opposite of hot?", ["cold", "warm", "big", "fast"], "cold"),
+     _q("What's the opposite of 'hot'?", ["warm", "cold", "fast", "big"], "cold"), True),
+    (_q("Choose the correct word: I ___ football yesterday.", ["play", "played", "playing", "plays"], "played"),
+     _q("Choose the correct word: I ___ football yesterday", ["played", "play", "plays", "playing"], "played"), True),
+    (_q("Which word is a verb?", ["run", "table", "blue", "happy"], "run"),
+     _q("Which of these words is a verb?", ["run", "table", "blue", "happy"], "run"), True),
+    (_q("My father ___ a doctor.", ["is", "are", "am", "be"], "is"),
+     _q("My father ____ a doctor", ["is", "are", "am", "be"], "is"), True),
+    (_q("What is the capital of France?", ["Paris", "Madrid", "Rome", "Berlin"], "Paris"),
+     _q("What is the capital of Spain?", ["Paris", "Madrid", "Rome", "Berlin"], "Madrid"), False),
+    (_q("Choose the correct option: She ____ to school every day.", ["go", "goes", "going", "gone"], "goes"),
+     _q("Choose the correct option: They ____ to school every day.", ["go", "goes", "going", "gone"], "go"), False),
+    (_q("What is the opposite of hot?", ["cold", "warm", "big", "fast"], "cold"),
+     _q("What is the opposite of tall?", ["short", "warm", "big", "fast"], "short"), False),
+    (_q("Which word is a verb?", ["run", "table", "blue", "happy"], "run"),
+     _q("Which word is a noun?", ["run", "table", "blue", "happy"], "table"), False),
+    (_q("I ___ football yesterday.", ["play", "played", "playing", "plays"], "played"),
+     _q("I ___ football every Sunday.", ["play", "played", "playing", "plays"], "play"), False),
+]
+
+
+def bench_pairs():
+    """-> (near-duplicates caught, distinct pairs wrongly merged)"""
+    caught = merged = 0
+    for a, b, should_match in PAIRS:
+        sim = similarity(A._near_sig(a), A._near_sig(b))
+        hit = sim >= A.NEAR_DUP_THRESHOLD
+        caught += hit and should_match
+        merged += hit and not should_match
+        label = "near-dup" if should_match else "distinct"
+        print(f"  {label:<8} {sim:4.2f} {'dup ' if hit else 'keep'}  {a['question']!r} / {b['question']!r}")
+    return caught, merged
+
+
+def _random_sig(rng):
+    return tuple(rng.getrandbits(32) for _ in range(A.near_hasher.num_perm))
+
+
+def _us(total_sec, n):
+    return total_sec / n * 1e6
+
+
+def bench_memory(rows, rng):
+    index = LshIndex(threshold=A.NEAR_DUP_THRESHOLD)
+    for i in range(rows):
+        index.add(i, _random_sig(rng))
+    sigs = [A.near_hasher.signature(f"{QUESTIONS[i % len(QUESTIONS)]} {i}") for i in range(LOOKUPS)]
+
+    t = time.perf_counter()
+    for sig in sigs:
+        index.query(sig)
+    query_us = _us(time.perf_counter() - t, LOOKUPS)
+
+    t = time.perf_counter()
+    for i, sig in enumerate(sigs):
+        index.add(rows + i, sig)
+    add_us = _us(time.perf_counter() - t, LOOKUPS)
+    return add_us, query_us
+
+
+def fill_db(rows, rng):
+    questions = AiQuestion.__table__
+    lsh = AiQuestionLsh.__table__
+    start = (db.session.query(db.func.max(AiQuestion.id)).scalar() or 0) + 1
+    for lo in range(0, rows, FILL_BATCH):
+        ids = range(start + lo, start + min(rows, lo + FILL_BATCH))
+        sigs = [_random_sig(rng) for _ in ids]
+        db.session.execute(questions.insert(), [
+            {
+                "id": qid, "material": MATERIAL, "qtype": "mcq", "question": f"filler {qid}",
+                "answer": "a", "source": "bench", "created_at": 0,
+                "fingerprint": f"{qid:040d}", "minhash": sig_to_bytes(sig),
+            }
+            for qid, sig in zip(ids, sigs)
+        ])
+        db.session.execute(lsh.insert(), [
+            {"material": MATERIAL, "bucket": b, "question_id": qid}
+            for qid, sig in zip(ids, sigs)
+            for b in set(A.near_bands.buckets(sig))
+        ])
+        db.session.commit()
+
+
+def bench_db():
+    texts = [f"{QUESTIONS[i % len(QUESTIONS)]} ({i})" for i in range(LOOKUPS)]
+    sigs = [A._near_sig({"question": t, "answer": "a"}) for t in texts]
+    A._bank_near_dups(MATERIAL, sigs[:1])  # warm the statement cache
+
+    t = time.perf_counter()
+    for sig in sigs:
+        A._bank_near_dups(MATERIAL, [sig])
+    lookup_us = _us(time.perf_counter() - t, LOOKUPS)
+
+    # full save path for one question (lookup + insert + buckets + commit)
+    t = time.perf_counter()
+    for text in texts:
+        A.save_questions(MATERIAL, "bench", "easy", [{"question": text, "choices": [], "answer": "a"}], "bench")
+    save_us = _us(time.perf_counter() - t, LOOKUPS)
+
+    # a reworded question must be found among all the rows
+    hit = A._bank_near_dups(MATERIAL, [A._near_sig({"question": "She ____ to school everyday. (0)", "answer": "a"})])
+    return lookup_us, save_us, bool(hit)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(7)
+
+    print(f"pairs at NEAR_DUP_THRESHOLD={A.NEAR_DUP_THRESHOLD}:")
+    caught, merged = bench_pairs()
+    expected = sum(1 for *_, m in PAIRS if m)
+    print(f"near-duplicates caught: {caught}/{expected} | distinct pairs merged: {merged}/{len(PAIRS) - expected}")
+    if merged:
+        sys.exit("distinct questions would be dropped as near-duplicates")
+    if caught < expected:
+        sys.exit("near-duplicates would be missed")
+
+    t = time.perf_counter()
+    for i in range(1000):
+        A.near_hasher.signature(f"{QUESTIONS[i % len(QUESTIONS)]} {i}")
+    print(f"signature:            {_us(time.perf_counter() - t, 1000):8.1f} us/question")
+
+    add_us, query_us = bench_memory(MEMORY_KEYS, rng)
+    print(f"LshIndex ({MEMORY_KEYS} keys): add {add_us:8.1f} us | query {query_us:8.1f} us")
+
+    with A.app.app_context():
+        db.create_all()
+        t = time.perf_counter()
+        fill_db(rows, rng)
+        print(f"filled {rows} rows in {time.perf_counter() - t:.1f}s")
+        try:
+            lookup_us, save_us, found = bench_db()
+            print(f"ai_question_lsh ({rows} rows): lookup {lookup_us:8.1f} us | save 1 question {save_us:8.1f} us")
+            print(f"reworded question found: {found}")
+        finally:
+            AiQuestion.query.filter(AiQuestion.material == MATERIAL).delete()
+            AiQuestionLsh.query.filter(AiQuestionLsh.material == MATERIAL).delete()
+            db.session.commit()
+
+
+if __name__ == "__main__":
+    main()
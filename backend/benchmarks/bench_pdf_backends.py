@@ -0,0 +1,67 @@
+"""
+PDF extraction backends (pdf_extract.BACKENDS) against each other on generated fixtures:
+a one-column book and a two-column book (pdf_fixture.py), whose exact text is known.
+
+    cd backend
+    python benchmarks/bench_pdf_backends.py              # 100 pages per fixture
+    python benchmarks/bench_pdf_backends.py 300          # bigger books
+
+pages/s:  whole book, no character budget
+peak MB:  tracemalloc peak while extracting the first MEMORY_PAGES pages (streaming keeps it flat)
+words:    share of the fixture's words found in the output (multiset overlap)
+lines:    share of the fixture's rows that come out as a line of their own, in reading order
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_extract import BACKENDS, extract_text  # noqa: E402
+from pdf_fixture import fixture_pages, make_pdf  # noqa: E402
+
+NO_LIMIT = 10 ** 12
+MEMORY_PAGES = 10
+FIXTURES = {"1-column": 1, "2-column": 2}
+
+
+def _fidelity(expected, got):
+    """(word recall, line recall) averaged over pages"""
+    words = lines = 0.0
+    for n, cols in enumerate(expected, start=1):
+        rows = [r for col in cols for r in col]
+        want = Counter(w for r in rows for w in r.split())
+        have = Counter(got.get(n, "").split())
+        words += sum((want & have).values()) / sum(want.values())
+        out_lines = {" ".join(line.split()) for line in got.get(n, "").splitlines()}
+        lines += sum(r in out_lines for r in rows) / len(rows)
+    return words / len(expected), lines / len(expected)
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'fixture':<9} | {'backend':<10} | {'pages/s':>8} | {'peak MB':>7} | {'words':>6} | {'lines':>6}")
+        for label, columns in FIXTURES.items():
+            path = make_pdf(os.path.join(tmp, f"{label}.pdf"), pages, columns=columns)
+            expected = fixture_pages(pages, columns=columns)
+            for backend in BACKENDS:
+                got = {}
+                t = time.perf_counter()
+                extract_text(path, max_chars=NO_LIMIT, sink=got, backend=backend)
+                rate = pages / (time.perf_counter() - t)
+
+                tracemalloc.start()
+                extract_text(path, pages=f"1-{MEMORY_PAGES}", max_chars=NO_LIMIT, backend=backend)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                words, lines = _fidelity(expected, got)
+                print(f"{label:<9} | {backend:<10} | {rate:>8.1f} | {peak / 1e6:>7.1f} | {words:>6.3f} | {lines:>6.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Pages/second of PDF text extraction in-process vs on a process pool (ParallelExtractor)
+for 1, 2, 4, ... workers up to the core count, on a generated PDF (pdf_fixture.py).
+
+    cd backend
+    python benchmarks/bench_pdf_extract.py                 # 300 pages, up to os.cpu_count() workers
+    python benchmarks/bench_pdf_extract.py 600 8           # 600 pages, up to 8 workers
+
+Every run extracts the whole book (no character budget) and must return the same text.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_extract import ParallelExtractor, extract_text  # noqa: E402
+from pdf_fixture import make_pdf  # noqa: E402
+
+NO_LIMIT = 10 ** 12
+
+
+def _workers(limit):
+    n, out = 2, []
+    while n < limit:
+        out.append(n)
+        n *= 2
+    return out + [limit] if limit > 1 else out
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = make_pdf(os.path.join(tmp, "book.pdf"), pages)
+        print(f"fixture: {pages} pages, {os.path.getsize(path) / 1e6:.1f} MB, {os.cpu_count()} cores")
+        print(f"{'workers':>8} | {'seconds':>8} | {'pages/s':>8} | {'speedup':>7}")
+
+        t = time.perf_counter()
+        expected = extract_text(path, max_chars=NO_LIMIT)
+        base = time.perf_counter() - t
+        print(f"{'1 (in)':>8} | {base:>8.2f} | {pages / base:>8.1f} | {1.0:>6.2f}x")
+
+        for n in _workers(max_workers):
+            extractor = ParallelExtractor(workers=n, min_bytes=0)
+            extractor._get_pool().submit(int).result()  # start the pool outside the timing
+            t = time.perf_counter()
+            result = extractor.extract(path, max_chars=NO_LIMIT)
+            sec = time.perf_counter() - t
+            extractor._reset_pool()
+            assert result["text"] == expected["text"], "parallel text differs"
+            print(f"{n:>8} | {sec:>8.2f} | {pages / sec:>8.1f} | {base / sec:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Round trips for saving one quiz: per-row add+flush (old save_questions) vs bulk INSERT ... RETURNING.
+
+    cd backend
+    python benchmarks/bench_save_questions.py            # in-memory SQLite
+    DATABASE_URL=postgresql://... python benchmarks/bench_save_questions.py
+
+Every cursor execute and every COMMIT counts as one round trip to the database.
+"""
+import hashlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import event  # noqa: E402
+
+import app as A  # noqa: E402
+from models import AiQuestion, db  # noqa: E402
+
+SIZES = [10, 30, 100]
+MATERIAL = "__bench_save_questions__"
+
+
+def _questions(n, tag):
+    # random-looking text: templated stems would be caught as near-duplicates
+    return [
+        {
+            "qtype": "mcq",
+            "question": hashlib.sha1(f"{tag} {i}".encode()).hexdigest() + "?",
+            "choices": ["a", "b", "c", "d"],
+            "answer": "a",
+            "explanation": "bench",
+        }
+        for i in range(n)
+    ]
+
+
+def save_questions_per_row(material, topic, difficulty, questions, source):
+    """The previous implementation, kept here as the baseline."""
+    now = int(time.time())
+    ids = []
+    for q in questions:
+        row = AiQuestion(
+            material=material, topic=topic, difficulty=difficulty,
+            qtype=q.get("qtype", "mcq"), question=q["question"],
+            choices=q.get("choices", []),
+            answer=q["answer"], explanation=q.get("explanation", ""),
+            source=source, created_at=now, fingerprint=A._bank_fingerprint(q),
+        )
+        db.session.add(row)
+        db.session.flush()
+        ids.append(row.id)
+    db.session.commit()
+    return ids
+
+
+def main():
+    counts = {"n": 0}
+
+    with A.app.app_context():
+        db.create_all()
+        engine = db.engine
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _count_execute(*args, **kwargs):
+            counts["n"] += 1
+
+        @event.listens_for(engine, "commit")
+        def _count_commit(*args, **kwargs):
+            counts["n"] += 1
+
+        print(f"{'questions':>9} | {'impl':<9} | {'round trips':>11} | {'ms':>8}")
+        for n in SIZES:
+            for name, fn in (("per-row", save_questions_per_row), ("bulk", A.save_questions)):
+                counts["n"] = 0
+                t = time.perf_counter()
+                ids = fn(MATERIAL, "bench", "easy", _questions(n, f"{name}-{n}"), "bench")
+                ms = (time.perf_counter() - t) * 1000
+                if isinstance(ids, tuple):
+                    ids = ids[0]  # (new_ids, existing_ids)
+                assert len(ids) == n
+                print(f"{n:>9} | {name:<9} | {counts['n']:>11} | {ms:>8.1f}")
+
+        AiQuestion.query.filter(AiQuestion.material == MATERIAL).delete()
+        db.session.commit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Writes a plain multi-page text PDF without any PDF library (Helvetica, one content
+stream per page, one or more text columns), for the PDF extraction benchmarks.
+fixture_pages() returns the text it writes, to score extracted text against.
+
+    cd backend
+    python benchmarks/pdf_fixture.py out.pdf 400
+    python benchmarks/pdf_fixture.py out.pdf 400 2      # two text columns per page
+"""
+import random
+import sys
+from typing import List
+
+WORDS = (
+    "the student reads a short text about school life and answers questions on grammar "
+    "vocabulary tense present past future verb noun adjective teacher lesson unit book "
+    "family weather sport holiday city village market friend morning evening every day"
+).split()
+
+
+def _escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _page_rows(rng: random.Random, page: int, lines: int, columns: int, words: int) -> List[List[str]]:
+    """Rows of each column of one page, in reading order."""
+    cols = [[f"Unit {page // 10 + 1} - page {page + 1}"]] + [[] for _ in range(columns - 1)]
+    for col in cols:
+        col.extend(" ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "." for _ in range(lines))
+    return cols
+
+
+def fixture_pages(pages: int, lines: int = 45, seed: int = 1, columns: int = 1) -> List[List[List[str]]]:
+    """pages -> columns -> rows; the text make_pdf() writes with the same arguments."""
+    rng = random.Random(seed)
+    words = 12 if columns == 1 else 5
+    return [_page_rows(rng, p, lines, columns, words) for p in range(pages)]
+
+
+def make_pdf(path: str, pages: int, lines: int = 45, seed: int = 1, columns: int = 1) -> str:
+    objs = [b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>", b""]  # 1 font, 2 page tree
+    kids = []
+    width = 500 // columns
+    for cols in fixture_pages(pages, lines, seed, columns):
+        body = " ".join(
+            f"BT /F1 11 Tf {50 + i * width} 800 Td 16 TL " + " ".join(f"({_escape(r)}) '" for r in rows) + " ET"
+            for i, rows in enumerate(cols)
+        )
+        objs.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(body), body.encode("latin-1")))
+        content = len(objs)
+        objs.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 1 0 R >> >> /Contents %d 0 R >>" % content
+        )
+        kids.append(len(objs))
+    objs[1] = b"<< /Type /Pages /Count %d /Kids [%s] >>" % (pages, b" ".join(b"%d 0 R" % k for k in kids))
+    objs.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objs, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, obj)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, len(objs), xref)
+    with open(path, "wb") as fh:
+        fh.write(out)
+    return path
+
+
+if __name__ == "__main__":
+    make_pdf(
+        sys.argv[1],
+        int(sys.argv[2]) if len(sys.argv) > 2 else 400,
+        columns=int(sys.argv[3]) if len(sys.argv) > 3 else 1,
+    )
@@ -0,0 +1,248 @@
+import hashlib
+import math
+import os
+import struct
+from typing import List, Optional, Tuple
+
+_MAGIC = b"SBF2"
+_HEADER = struct.Struct("<4sQdddI")  # magic, initial_capacity, error_rate, growth, tightening, filters
+_FILTER = struct.Struct("<QdQH")      # capacity, error_rate, count, num_hashes
+
+_BLOCK_BYTES = 64                     # 512-bit blocks
+_BLOCK_BITS = _BLOCK_BYTES * 8
+_MAX_HASHES = 28                      # in-block positions: 16-bit digest words, low 9 bits used
+_POSITIONS = struct.Struct(f"<{_MAX_HASHES}H")
+
+
+def _blocked_fp(bits_per_item: float, k: int) -> float:
+    """False-positive rate of a blocked Bloom filter (Poisson number of items per block)."""
+    lam = _BLOCK_BITS / bits_per_item
+    p = math.exp(-lam)
+    total = 0.0
+    for j in range(int(lam * 4) + 60):
+        if j:
+            p *= lam / j
+        total += p * (1 - (1 - 1 / _BLOCK_BITS) ** (k * j)) ** k
+    return total
+
+
+def _masks(positions: Tuple[int, ...], k: int) -> List[int]:
+    """masks[i] = in-block bit mask of the first i positions (filters may differ in k)."""
+    out = [0]
+    m = 0
+    for v in positions[:k]:
+        m |= 1 << (v & (_BLOCK_BITS - 1))
+        out.append(m)
+    return out
+
+
+class BloomFilter:
+    """
+    Fixed-size blocked Bloom filter for strings: all k bits of an item sit in one
+    512-bit block, so a lookup is one block read and a mask compare instead of k
+    bit probes. Sized for `capacity` items at `error_rate` false positives (blocking
+    costs ~10-30% more bits than a classic filter at the same rate). Past capacity
+    the false-positive rate grows (check `saturated`). Never false negatives.
+    """
+
+    def __init__(self, capacity: int = 1000, error_rate: float = 0.01, num_hashes: Optional[int] = None):
+        self.capacity = max(1, int(capacity))
+        self.error_rate = float(error_rate)
+        k = num_hashes or round(-math.log2(self.error_rate))
+        self.num_hashes = min(_MAX_HASHES, max(1, int(k)))
+        bits_per_item = -math.log(self.error_rate) / math.log(2) ** 2
+        while _blocked_fp(bits_per_item, self.num_hashes) > self.error_rate and bits_per_item < 256:
+            bits_per_item *= 1.02
+        self.num_blocks = max(1, math.ceil(self.capacity * bits_per_item / _BLOCK_BITS))
+        self.num_bits = self.num_blocks * _BLOCK_BITS
+        self.bits = bytearray(self.num_blocks * _BLOCK_BYTES)
+        self.count = 0  # items added (repeats and false positives not counted)
+
+    @staticmethod
+    def _digest(item: str) -> Tuple[int, Tuple[int, ...]]:
+        """(block hash, in-block positions); one digest serves every filter of a ScalableBloomFilter"""
+        d = hashlib.blake2b(item.encode("utf-8"), digest_size=64).digest()
+        return int.from_bytes(d[:8], "little"), _POSITIONS.unpack_from(d, 8)
+
+    def _block(self, h: int) -> slice:
+        i = h % self.num_blocks * _BLOCK_BYTES
+        return slice(i, i + _BLOCK_BYTES)
+
+    def _has(self, h: int, mask: int) -> bool:
+        return int.from_bytes(self.bits[self._block(h)], "little") & mask == mask
+
+    def _add(self, h: int, mask: int) -> bool:
+        where = self._block(h)
+        block = int.from_bytes(self.bits[where], "little")
+        if block & mask == mask:
+            return False
+        self.bits[where] = (block | mask).to_bytes(_BLOCK_BYTES, "little")
+        self.count += 1
+        return True
+
+    def add(self, item: str) -> bool:
+        """Add item; False if it was (probably) already present."""
+        h, positions = self._digest(item)
+        return self._add(h, _masks(positions, self.num_hashes)[-1])
+
+    def __contains__(self, item: str) -> bool:
+        h, positions = self._digest(item)
+        return self._has(h, _masks(positions, self.num_hashes)[-1])
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def saturated(self) -> bool:
+        return self.count >= self.capacity
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.bits)
+
+    def merge(self, other: "BloomFilter"):
+        """In-place union with a filter of the same size (e.g. built by another worker)."""
+        if (other.num_bits, other.num_hashes) != (self.num_bits, self.num_hashes):
+            raise ValueError("can only merge Bloom filters with the same capacity and error rate")
+        self.bits = bytearray((int.from_bytes(self.bits, "little") | int.from_bytes(other.bits, "little"))
+                              .to_bytes(len(self.bits), "little"))
+        self.count = self.estimated_count()
+
+    def estimated_count(self) -> int:
+        """Items in the filter estimated from the fraction of set bits (works after merges)."""
+        ones = bin(int.from_bytes(self.bits, "little")).count("1")
+        if ones >= self.num_bits:
+            return self.capacity
+        return round(-self.num_bits / self.num_hashes * math.log(1 - ones / self.num_bits))
+
+
+class ScalableBloomFilter:
+    """
+    Bloom filter that grows by adding filters instead of losing accuracy
+    (Almeida et al., "Scalable Bloom Filters"). Filter i holds
+    initial_capacity * growth**i items at error_rate * (1 - tightening) * tightening**i,
+    so the overall false-positive rate stays below `error_rate` however many items arrive.
+    Memory grows with the number of items (2-4 bytes per item at 0.1%, about 4 once it has grown), not with their size.
+    - save(path) / load(path): a single binary file
+    - merge(other): union with a filter built with the same parameters in another process
+    """
+
+    def __init__(
+        self, initial_capacity: int = 10000, error_rate: float = 0.001,
+        growth: float = 2.0, tightening: float = 0.8,
+    ):
+        self.initial_capacity = max(1, int(initial_capacity))
+        self.error_rate = float(error_rate)
+        self.growth = float(growth)
+        self.tightening = float(tightening)
+        # one k for every filter: a lookup builds one mask and reads one block per filter;
+        # tighter filters get more bits per item instead of more hashes
+        self.num_hashes = min(_MAX_HASHES, round(-math.log2(self.error_rate * (1 - self.tightening))) + 1)
+        self.filters: List[BloomFilter] = []
+        self._last: Optional[Tuple[str, int, int, bool]] = None  # `x in f` then `f.add(x)` hashes once
+
+    def _next_filter(self) -> BloomFilter:
+        i = len(self.filters)
+        f = BloomFilter(
+            int(self.initial_capacity * self.growth ** i),
+            self.error_rate * (1 - self.tightening) * self.tightening ** i,
+            self.num_hashes,
+        )
+        self.filters.append(f)
+        return f
+
+    def _lookup(self, item: str) -> Tuple[bool, int, int]:
+        last = self._last
+        if last is not None and last[0] == item:
+            return last[3], last[1], last[2]
+        h, positions = BloomFilter._digest(item)
+        mask = _masks(positions, self.num_hashes)[-1]
+        # newest (largest) filter first
+        hit = False
+        for f in reversed(self.filters):
+            if f._has(h, mask):
+                hit = True
+                break
+        self._last = (item, h, mask, hit)
+        return hit, h, mask
+
+    def add(self, item: str) -> bool:
+        hit, h, mask = self._lookup(item)
+        if hit:
+            return False
+        f = self.filters[-1] if self.filters else self._next_filter()
+        if f.saturated:
+            f = self._next_filter()
+        self._last = None
+        return f._add(h, mask)
+
+    def __contains__(self, item: str) -> bool:
+        return self._lookup(item)[0]
+
+    def __len__(self) -> int:
+        return sum(f.count for f in self.filters)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(f.nbytes for f in self.filters)
+
+    def merge(self, other: "ScalableBloomFilter"):
+        """
+        In-place union. Filters at the same position are OR-ed while the union still
+        fits their capacity; otherwise the other filter is kept alongside, so the merged
+        false-positive rate is at most the sum of the two inputs' rates.
+        """
+        params = (self.initial_capacity, self.error_rate, self.growth, self.tightening)
+        if (other.initial_capacity, other.error_rate, other.growth, other.tightening) != params:
+            raise ValueError("can only merge scalable Bloom filters built with the same parameters")
+        self._last = None
+        mine = list(self.filters)
+        for i, theirs in enumerate(other.filters):
+            if i < len(mine) and mine[i].num_bits == theirs.num_bits:
+                union = BloomFilter(mine[i].capacity, mine[i].error_rate, mine[i].num_hashes)
+                union.bits = bytearray(mine[i].bits)
+                union.merge(theirs)
+                if union.count <= union.capacity:
+                    self.filters[i] = union
+                    continue
+            copy = BloomFilter(theirs.capacity, theirs.error_rate, theirs.num_hashes)
+            copy.bits, copy.count = bytearray(theirs.bits), theirs.count
+            self.filters.append(copy)
+
+    # ----- disk -----
+    def to_bytes(self) -> bytes:
+        parts = [_HEADER.pack(
+            _MAGIC, self.initial_capacity, self.error_rate, self.growth, self.tightening, len(self.filters)
+        )]
+        for f in self.filters:
+            parts.append(_FILTER.pack(f.capacity, f.error_rate, f.count, f.num_hashes))
+            parts.append(bytes(f.bits))
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "ScalableBloomFilter":
+        magic, capacity, error_rate, growth, tightening, n = _HEADER.unpack_from(raw, 0)
+        if magic != _MAGIC:
+            raise ValueError("not a scalable Bloom filter file")
+        sbf = cls(capacity, error_rate, growth, tightening)
+        pos = _HEADER.size
+        for _ in range(n):
+            f_capacity, f_error, f_count, f_hashes = _FILTER.unpack_from(raw, pos)
+            pos += _FILTER.size
+            f = BloomFilter(f_capacity, f_error, f_hashes)
+            f.bits = bytearray(raw[pos:pos + len(f.bits)])
+            f.count = f_count
+            pos += len(f.bits)
+            sbf.filters.append(f)
+        return sbf
+
+    def save(self, path: str):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(self.to_bytes())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ScalableBloomFilter":
+        with open(path, "rb") as fh:
+            return cls.from_bytes(fh.read())
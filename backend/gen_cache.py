@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class GenerationCache:
+    """
+    Content-addressed cache for deterministic LLM generations.
+    - key: sha256 of the canonical JSON of (model, prompt, options, format)
+    - memory tier: LRU + TTL, capped by total bytes of the stored JSON
+    - optional disk tier (one JSON file per key), also capped by bytes
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 32 * 1024 * 1024,
+        ttl_sec: float = 24 * 3600,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.max_bytes = int(max_bytes)
+        self.ttl_sec = float(ttl_sec)
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = int(disk_max_bytes)
+
+        self._lock = threading.Lock()
+        self._mem: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()  # key -> (stored_at, json)
+        self._mem_bytes = 0
+        self._disk_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_bytes = sum(
+                e.stat().st_size for e in os.scandir(self.disk_dir) if e.name.endswith(".json")
+            )
+
+    @staticmethod
+    def key(payload: Dict[str, Any]) -> str:
+        parts = {k: payload.get(k) for k in ("model", "prompt", "options", "format")}
+        # whitespace-only differences in the prompt don't change the request
+        parts["prompt"] = " ".join(str(parts["prompt"] or "").split())
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit and now - hit[0] < self.ttl_sec:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return json.loads(hit[1])
+            if hit:
+                self._drop(key)
+
+        stored = self._disk_get(key, now)
+        with self._lock:
+            if stored is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._mem_put(key, stored[0], stored[1])
+        return json.loads(stored[1])
+
+    def put(self, key: str, value: Any):
+        raw = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._mem_put(key, now, raw)
+        self._disk_put(key, now, raw)
+
+    def _mem_put(self, key: str, stored_at: float, raw: str):
+        size = len(raw.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._mem:
+            self._drop(key)
+        self._mem[key] = (stored_at, raw)
+        self._mem_bytes += size
+        while self._mem_bytes > self.max_bytes:
+            old = next(iter(self._mem))
+            self._drop(old)
+            self.evictions += 1
+
+    def _drop(self, key: str):
+        _, raw = self._mem.pop(key)
+        self._mem_bytes -= len(raw.encode("utf-8"))
+
+    # ----- disk tier -----
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key + ".json")
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[float, str]]:
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                raw = f.read()
+            stored_at = os.path.getmtime(path)
+        except Exception:
+            return None
+        if now - stored_at >= self.ttl_sec:
+            self._disk_remove(path)
+            return None
+        os.utime(path)  # LRU on disk = mtime
+        return stored_at, raw
+
+    def _disk_put(self, key: str, stored_at: float, raw: str):
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        data = raw.encode("utf-8")
+        try:
+            old = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except Exception:
+            return
+        with self._lock:
+            self._disk_bytes += len(data) - old
+            over = self._disk_bytes > self.disk_max_bytes
+        if over:
+            self._disk_evict()
+
+    def _disk_remove(self, path: str):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except Exception:
+            return
+        with self._lock:
+            self._disk_bytes -= size
+
+    def _disk_evict(self):
+        entries = sorted(
+            (e for e in os.scandir(self.disk_dir) if e.name.endswith(".json")),
+            key=lambda e: e.stat().st_mtime,
+        )
+        for e in entries:
+            with self._lock:
+                if self._disk_bytes <= self.disk_max_bytes * 0.9:
+                    break
+            self._disk_remove(e.path)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._mem),
+                "bytes": self._mem_bytes,
+                "disk_bytes": self._disk_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round((self.hits + self.disk_hits) / total, 3) if total else 0.0,
+            }
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls: the first caller for a key runs fn(),
+    everyone arriving while it is in flight waits and gets the same result (or error).
+    A waiter gives up after its own `timeout` with TimeoutError; the leader keeps running.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if not flight.done.wait(timeout):
+                with self._lock:
+                    self.timeouts += 1
+                raise TimeoutError("coalesced generation timed out")
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "timeouts": self.timeouts,
+            }
@@ -0,0 +1,110 @@
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+class JsonItemParser:
+    """
+    Incremental parser for LLM JSON output.
+    Feed text fragments as they arrive; every JSON object that closes directly
+    inside an array (e.g. each item of {"questions": [...]} or of a bare [...])
+    is returned as soon as its closing brace is seen.
+    Text outside JSON (markdown fences, chatter) is ignored.
+    """
+
+    def __init__(self):
+        self._stack: List[str] = []       # open containers: "{" or "["
+        self._item: Optional[List[str]] = None  # chars of the array item being read
+        self._item_depth = 0              # stack depth of the array owning that item
+        self._in_str = False
+        self._escape = False
+        self.objects = 0                  # items parsed OK
+        self.errors = 0                   # items that closed but failed json.loads
+
+    def feed(self, text: str) -> List[Any]:
+        out: List[Any] = []
+        for ch in text or "":
+            if self._item is not None:
+                self._item.append(ch)
+
+            if self._in_str:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_str = False
+                continue
+
+            if ch == '"':
+                if self._stack:
+                    self._in_str = True
+            elif ch in "{[":
+                if ch == "{" and self._item is None and self._stack and self._stack[-1] == "[":
+                    self._item = [ch]
+                    self._item_depth = len(self._stack)
+                self._stack.append(ch)
+            elif ch in "}]" and self._stack:
+                self._stack.pop()
+                if self._item is not None and len(self._stack) == self._item_depth:
+                    item = self._close_item()
+                    if item is not None:
+                        out.append(item)
+        return out
+
+    def _close_item(self):
+        raw = "".join(self._item)
+        self._item = None
+        try:
+            item = json.loads(raw)
+        except Exception:
+            # most common LLM slip inside one item: {"a": 1,}
+            try:
+                item = json.loads(_TRAILING_COMMA.sub(r"\1", raw))
+            except Exception:
+                self.errors += 1
+                return None
+        self.objects += 1
+        return item
+
+    @property
+    def truncated(self) -> bool:
+        """An array item was still open when the text ended (cut-off output)."""
+        return self._item is not None
+
+
+def salvage_items(text: str) -> Tuple[List[Any], int]:
+    """
+    Recover every well-formed array item from a broken / truncated response.
+    Returns (items, dropped) where dropped counts malformed or cut-off items.
+    """
+    parser = JsonItemParser()
+    items = parser.feed(text)
+    return items, parser.errors + (1 if parser.truncated else 0)
+
+
+class SalvageStats:
+    """Process-wide counters for responses that did not parse as a whole."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.broken_responses = 0
+        self.salvaged = 0
+        self.dropped = 0
+
+    def record(self, salvaged: int, dropped: int):
+        with self._lock:
+            self.broken_responses += 1
+            self.salvaged += salvaged
+            self.dropped += dropped
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "broken_responses": self.broken_responses,
+                "salvaged": self.salvaged,
+                "dropped": self.dropped,
+            }
@@ -0,0 +1,33 @@
+"""ai_questions indexes for listing / bank sampling
+
+Revision ID: 3f9a2c1d7b64
+Revises: 78c7cd6d0808
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a2c1d7b64'
+down_revision = '78c7cd6d0808'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # GET /api/ai/questions?material=... ORDER BY id DESC (+ keyset before_id/after_id)
+    op.create_index('ix_ai_questions_material_id', 'ai_questions', ['material', 'id'], unique=False)
+    # material + qtype/difficulty filters, and bank sampling (min/max id + id range seek)
+    op.create_index('ix_ai_questions_material_qtype_difficulty_id', 'ai_questions', ['material', 'qtype', 'difficulty', 'id'], unique=False)
+    op.create_index('ix_ai_questions_material_topic_id', 'ai_questions', ['material', 'topic', 'id'], unique=False)
+    # created_at range filters
+    op.create_index('ix_ai_questions_created_at_id', 'ai_questions', ['created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_ai_questions_created_at_id', table_name='ai_questions')
+    op.drop_index('ix_ai_questions_material_topic_id', table_name='ai_questions')
+    op.drop_index('ix_ai_questions_material_qtype_difficulty_id', table_name='ai_questions')
+    op.drop_index('ix_ai_questions_material_id', table_name='ai_questions')
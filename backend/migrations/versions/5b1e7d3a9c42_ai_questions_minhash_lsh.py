@@ -0,0 +1,84 @@
+"""ai_questions.minhash + ai_question_lsh near-duplicate index
+
+Revision ID: 5b1e7d3a9c42
+Revises: c2d8f0a6e913
+Create Date: 2026-10-18 13:20:41.518302
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# signatures must match what the app computes, so use the same module (not a frozen copy)
+from near_dup import LshIndex, MinHasher, sig_to_bytes
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1e7d3a9c42'
+down_revision = 'c2d8f0a6e913'
+branch_labels = None
+depends_on = None
+
+BATCH = 1000
+
+
+def upgrade():
+    op.add_column('ai_questions', sa.Column('minhash', sa.LargeBinary(), nullable=True))
+    op.create_table(
+        'ai_question_lsh',
+        sa.Column('material', sa.String(length=200), nullable=False),
+        sa.Column('bucket', sa.BigInteger(), nullable=False),
+        sa.Column('question_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['question_id'], ['ai_questions.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('material', 'bucket', 'question_id'),
+    )
+
+    bind = op.get_bind()
+    t = sa.table(
+        'ai_questions',
+        sa.column('id', sa.Integer()),
+        sa.column('material', sa.String()),
+        sa.column('question', sa.Text()),
+        sa.column('choices', sa.JSON().with_variant(postgresql.JSONB(), 'postgresql')),
+        sa.column('minhash', sa.LargeBinary()),
+    )
+    lsh = sa.table(
+        'ai_question_lsh',
+        sa.column('material', sa.String()),
+        sa.column('bucket', sa.BigInteger()),
+        sa.column('question_id', sa.Integer()),
+    )
+    hasher, bands = MinHasher(), LshIndex()
+
+    # backfill in id-ordered batches (keyset, no OFFSET)
+    last_id = 0
+    update = t.update().where(t.c.id == sa.bindparam('b_id')).values(minhash=sa.bindparam('b_sig'))
+    while True:
+        rows = bind.execute(
+            sa.select(t.c.id, t.c.material, t.c.question, t.c.choices)
+            .where(t.c.id > last_id).order_by(t.c.id).limit(BATCH)
+        ).all()
+        if not rows:
+            break
+        params, buckets = [], []
+        for row_id, material, question, choices in rows:
+            if isinstance(choices, str):
+                choices = json.loads(choices or "[]")
+            # app._near_text for the lesson-quiz shape
+            sig = hasher.signature(" ".join([question or ""] + [str(c) for c in (choices or [])]))
+            params.append({'b_id': row_id, 'b_sig': sig_to_bytes(sig)})
+            buckets += [
+                {'material': material, 'bucket': b, 'question_id': row_id}
+                for b in set(bands.buckets(sig))
+            ]
+        bind.execute(update, params)
+        bind.execute(lsh.insert(), buckets)
+        last_id = rows[-1][0]
+
+
+def downgrade():
+    op.drop_table('ai_question_lsh')
+    with op.batch_alter_table('ai_questions') as batch_op:
+        batch_op.drop_column('minhash')
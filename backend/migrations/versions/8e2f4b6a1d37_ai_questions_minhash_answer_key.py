@@ -0,0 +1,79 @@
+"""re-sign ai_questions.minhash with the answer as MinHash key
+
+Revision ID: 8e2f4b6a1d37
+Revises: 5b1e7d3a9c42
+Create Date: 2026-10-18 16:05:12.204417
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# signatures must match what the app computes, so use the same module (not a frozen copy)
+from near_dup import LshIndex, MinHasher, sig_to_bytes
+
+
+# revision identifiers, used by Alembic.
+revision = '8e2f4b6a1d37'
+down_revision = '5b1e7d3a9c42'
+branch_labels = None
+depends_on = None
+
+BATCH = 1000
+
+
+def _resign(with_answer):
+    bind = op.get_bind()
+    t = sa.table(
+        'ai_questions',
+        sa.column('id', sa.Integer()),
+        sa.column('material', sa.String()),
+        sa.column('question', sa.Text()),
+        sa.column('choices', sa.JSON().with_variant(postgresql.JSONB(), 'postgresql')),
+        sa.column('answer', sa.Text()),
+        sa.column('minhash', sa.LargeBinary()),
+    )
+    lsh = sa.table(
+        'ai_question_lsh',
+        sa.column('material', sa.String()),
+        sa.column('bucket', sa.BigInteger()),
+        sa.column('question_id', sa.Integer()),
+    )
+    hasher, bands = MinHasher(), LshIndex()
+    bind.execute(lsh.delete())
+
+    # keyset batches, as in 5b1e7d3a9c42
+    last_id = 0
+    update = t.update().where(t.c.id == sa.bindparam('b_id')).values(minhash=sa.bindparam('b_sig'))
+    while True:
+        rows = bind.execute(
+            sa.select(t.c.id, t.c.material, t.c.question, t.c.choices, t.c.answer)
+            .where(t.c.id > last_id).order_by(t.c.id).limit(BATCH)
+        ).all()
+        if not rows:
+            break
+        params, buckets = [], []
+        for row_id, material, question, choices, answer in rows:
+            if isinstance(choices, str):
+                choices = json.loads(choices or "[]")
+            # app._near_sig for the lesson-quiz shape
+            text = " ".join([question or ""] + [str(c) for c in (choices or [])])
+            sig = hasher.signature(text, key=(answer or "") if with_answer else "")
+            params.append({'b_id': row_id, 'b_sig': sig_to_bytes(sig)})
+            buckets += [
+                {'material': material, 'bucket': b, 'question_id': row_id}
+                for b in set(bands.buckets(sig))
+            ]
+        bind.execute(update, params)
+        bind.execute(lsh.insert(), buckets)
+        last_id = rows[-1][0]
+
+
+def upgrade():
+    _resign(with_answer=True)
+
+
+def downgrade():
+    _resign(with_answer=False)
@@ -0,0 +1,65 @@
+"""ai_questions.choices as native JSON (JSONB on PostgreSQL)
+
+Revision ID: a7c4e91b2d05
+Revises: 3f9a2c1d7b64
+Create Date: 2026-10-18 11:03:27.540912
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c4e91b2d05'
+down_revision = '3f9a2c1d7b64'
+branch_labels = None
+depends_on = None
+
+JSON_TYPE = sa.JSON().with_variant(postgresql.JSONB(), 'postgresql')
+
+
+def upgrade():
+    op.add_column('ai_questions', sa.Column('choices', JSON_TYPE, nullable=True))
+
+    # backfill from the old JSON-as-text column
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("UPDATE ai_questions SET choices = COALESCE(NULLIF(choices_json, ''), '[]')::jsonb")
+        op.create_index(
+            'ix_ai_questions_choices_gin', 'ai_questions', ['choices'], unique=False,
+            postgresql_using='gin', postgresql_ops={'choices': 'jsonb_path_ops'}
+        )
+    elif dialect == 'sqlite':
+        op.execute("UPDATE ai_questions SET choices = json(COALESCE(NULLIF(choices_json, ''), '[]'))")
+    else:
+        _copy(op.get_bind(), 'choices_json', 'choices', to_json=True)
+
+    with op.batch_alter_table('ai_questions') as batch_op:
+        batch_op.drop_column('choices_json')
+
+
+def downgrade():
+    op.add_column('ai_questions', sa.Column('choices_json', sa.Text(), nullable=True))
+
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_index('ix_ai_questions_choices_gin', table_name='ai_questions')
+        op.execute("UPDATE ai_questions SET choices_json = choices::text")
+    elif dialect == 'sqlite':
+        op.execute("UPDATE ai_questions SET choices_json = json(choices)")
+    else:
+        _copy(op.get_bind(), 'choices', 'choices_json', to_json=False)
+
+    with op.batch_alter_table('ai_questions') as batch_op:
+        batch_op.drop_column('choices')
+
+
+def _copy(bind, src, dst, to_json):
+    # row-by-row fallback for dialects without JSON functions
+    t = sa.table('ai_questions', sa.column('id'), sa.column('choices_json', sa.Text()), sa.column('choices', JSON_TYPE))
+    for row_id, value in bind.execute(sa.select(t.c.id, t.c[src])).all():
+        value = json.loads(value or "[]") if to_json else json.dumps(value or [], ensure_ascii=False)
+        bind.execute(t.update().where(t.c.id == row_id).values({dst: value}))
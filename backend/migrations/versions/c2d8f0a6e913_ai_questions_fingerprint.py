@@ -0,0 +1,93 @@
+"""ai_questions.fingerprint + unique (material, fingerprint)
+
+Revision ID: c2d8f0a6e913
+Revises: a7c4e91b2d05
+Create Date: 2026-10-18 11:48:05.207733
+
+"""
+import hashlib
+import json
+import re
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2d8f0a6e913'
+down_revision = 'a7c4e91b2d05'
+branch_labels = None
+depends_on = None
+
+BATCH = 1000
+
+
+# frozen copy of app._norm_text / app._bank_fingerprint at the time of this migration
+def _norm_text(s):
+    s = (s or "").strip().lower()
+    s = re.sub(r"[^\w\s]", "", s)
+    return re.sub(r"\s+", " ", s).strip()
+
+
+def _fingerprint(qtype, question, choices, answer):
+    parts = [qtype or "mcq", _norm_text(question)]
+    parts += [_norm_text(str(c)) for c in (choices or [])]
+    parts.append(_norm_text(answer))
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def upgrade():
+    op.add_column('ai_questions', sa.Column('fingerprint', sa.String(length=40), nullable=True))
+
+    bind = op.get_bind()
+    t = sa.table(
+        'ai_questions',
+        sa.column('id', sa.Integer()),
+        sa.column('material', sa.String()),
+        sa.column('qtype', sa.String()),
+        sa.column('question', sa.Text()),
+        sa.column('choices', sa.JSON().with_variant(postgresql.JSONB(), 'postgresql')),
+        sa.column('answer', sa.String()),
+        sa.column('fingerprint', sa.String()),
+    )
+
+    # backfill in id-ordered batches (keyset, no OFFSET)
+    last_id = 0
+    update = t.update().where(t.c.id == sa.bindparam('b_id')).values(fingerprint=sa.bindparam('b_fp'))
+    while True:
+        rows = bind.execute(
+            sa.select(t.c.id, t.c.qtype, t.c.question, t.c.choices, t.c.answer)
+            .where(t.c.id > last_id).order_by(t.c.id).limit(BATCH)
+        ).all()
+        if not rows:
+            break
+        params = []
+        for row_id, qtype, question, choices, answer in rows:
+            if isinstance(choices, str):
+                choices = json.loads(choices or "[]")
+            params.append({'b_id': row_id, 'b_fp': _fingerprint(qtype, question, choices, answer)})
+        bind.execute(update, params)
+        last_id = rows[-1][0]
+
+    # keep the oldest copy of every duplicate, then enforce uniqueness
+    dup = sa.alias(t, 'dup')
+    op.execute(
+        t.delete().where(
+            sa.exists().where(
+                dup.c.material == t.c.material,
+                dup.c.fingerprint == t.c.fingerprint,
+                dup.c.id < t.c.id,
+            )
+        )
+    )
+
+    with op.batch_alter_table('ai_questions') as batch_op:
+        batch_op.alter_column('fingerprint', existing_type=sa.String(length=40), nullable=False)
+    op.create_index('uq_ai_questions_material_fingerprint', 'ai_questions', ['material', 'fingerprint'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_ai_questions_material_fingerprint', table_name='ai_questions')
+    with op.batch_alter_table('ai_questions') as batch_op:
+        batch_op.drop_column('fingerprint')
@@ -0,0 +1,25 @@
+"""ai_questions index for bank sampling with a topic
+
+Revision ID: e5a1c9d3f072
+Revises: 8e2f4b6a1d37
+Create Date: 2026-10-18 18:20:37.512903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a1c9d3f072'
+down_revision = '8e2f4b6a1d37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # bank sampling with a topic filter: min/max id and the id range seek stay on the index
+    op.create_index('ix_ai_questions_material_qtype_difficulty_topic_id', 'ai_questions', ['material', 'qtype', 'difficulty', 'topic', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_ai_questions_material_qtype_difficulty_topic_id', table_name='ai_questions')
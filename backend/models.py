@@ -1,8 +1,12 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
 
 db = SQLAlchemy()
 
+# JSONB on PostgreSQL (Neon), plain JSON elsewhere (SQLite for local runs)
+JsonType = db.JSON().with_variant(JSONB(), "postgresql")
+
 class Test(db.Model):
     __tablename__ = "tests"
     id = db.Column(db.Integer, primary_key=True)
@@ -40,9 +44,39 @@ class AiQuestion(db.Model):
     qtype = db.Column(db.String(30), nullable=False)
 
     question = db.Column(db.Text, nullable=False)
-    choices_json = db.Column(db.Text)  # نخزنها JSON string
+    choices = db.Column(JsonType)  # list of strings (JSONB)
     answer = db.Column(db.String(300), nullable=False)
     explanation = db.Column(db.Text)
 
     source = db.Column(db.String(50), nullable=False)
     created_at = db.Column(db.Integer, nullable=False)
+    # sha1 of normalized qtype/question/choices/answer (app._bank_fingerprint)
+    fingerprint = db.Column(db.String(40), nullable=False)
+    # MinHash signature of question + choices (near_dup.sig_to_bytes), see AiQuestionLsh
+    minhash = db.Column(db.LargeBinary)
+
+    __table_args__ = (
+        db.Index("uq_ai_questions_material_fingerprint", "material", "fingerprint", unique=True),
+        db.Index("ix_ai_questions_material_id", "material", "id"),
+        db.Index("ix_ai_questions_material_qtype_difficulty_id", "material", "qtype", "difficulty", "id"),
+        db.Index(
+            "ix_ai_questions_material_qtype_difficulty_topic_id", "material", "qtype", "difficulty", "topic", "id",
+        ),
+        db.Index("ix_ai_questions_material_topic_id", "material", "topic", "id"),
+        db.Index("ix_ai_questions_created_at_id", "created_at", "id"),
+        db.Index(
+            "ix_ai_questions_choices_gin", "choices",
+            postgresql_using="gin", postgresql_ops={"choices": "jsonb_path_ops"},
+        ),
+    )
+
+class AiQuestionLsh(db.Model):
+    """LSH band buckets of ai_questions.minhash: near-duplicate lookup per material."""
+    __tablename__ = "ai_question_lsh"
+
+    material = db.Column(db.String(200), primary_key=True)
+    bucket = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    question_id = db.Column(
+        db.Integer, db.ForeignKey("ai_questions.id", ondelete="CASCADE"),
+        primary_key=True, autoincrement=False,
+    )
@@ -0,0 +1,164 @@
+import hashlib
+import random
+import re
+import threading
+from array import array
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+_MAX_HASH = (1 << 32) - 1
+
+Signature = Tuple[int, ...]
+
+
+def normalize(text: str) -> str:
+    """lowercase, one "_" per blank (___ == ____), punctuation dropped, single spaces"""
+    s = (text or "").lower()
+    s = re.sub(r"_+", "_", s)
+    s = re.sub(r"[^\w\s]", " ", s)
+    return re.sub(r"\s+", " ", s).strip()
+
+
+def shingles(text: str, k: int = 3) -> List[str]:
+    """Character k-grams of the normalized text (the whole text if it is shorter than k)."""
+    s = normalize(text)
+    if len(s) <= k:
+        return [s] if s else []
+    return list({s[i:i + k] for i in range(len(s) - k + 1)})
+
+
+class MinHasher:
+    """
+    MinHash signatures over character shingles, computed with one-permutation
+    hashing: each shingle is hashed once into one of `num_perm` bins and every bin
+    keeps its minimum. Empty bins borrow from another bin along a fixed,
+    seeded probe order, so signatures stay comparable position by position.
+    Equal positions estimate the Jaccard similarity of the two shingle sets.
+    Costs O(shingles) instead of O(shingles * num_perm).
+    """
+
+    def __init__(self, num_perm: int = 64, k: int = 3, seed: int = 1):
+        self.num_perm = int(num_perm)
+        self.k = int(k)
+        rng = random.Random(seed)
+        self._salt = rng.getrandbits(64).to_bytes(8, "little")
+        self._probes: List[List[int]] = []
+        for i in range(self.num_perm):
+            order = [b for b in range(self.num_perm) if b != i]
+            rng.shuffle(order)
+            self._probes.append(order)
+
+    def signature(self, text: str, key: str = "") -> Signature:
+        """
+        `key` is hashed into every shingle: texts with different keys (e.g. different
+        correct answers) share no shingles, so they estimate as ~0 similar.
+        """
+        n = self.num_perm
+        mins: List[Optional[int]] = [None] * n
+        prefix = normalize(key) + "\x1f" if key else ""
+        for s in shingles(text, self.k):
+            h = int.from_bytes(
+                hashlib.blake2b((prefix + s).encode("utf-8"), digest_size=8, key=self._salt).digest(), "little"
+            )
+            b, v = h % n, (h // n) & _MAX_HASH
+            if mins[b] is None or v < mins[b]:
+                mins[b] = v
+        if all(m is None for m in mins):
+            return (_MAX_HASH,) * n
+        out = list(mins)
+        for i, m in enumerate(mins):
+            if m is None:
+                out[i] = next(mins[b] for b in self._probes[i] if mins[b] is not None)
+        return tuple(out)
+
+
+def similarity(a: Sequence[int], b: Sequence[int]) -> float:
+    """Estimated Jaccard similarity of two signatures of the same length."""
+    if not a or len(a) != len(b):
+        return 0.0
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def sig_to_bytes(sig: Sequence[int]) -> bytes:
+    return array("I", sig).tobytes()
+
+
+def sig_from_bytes(raw: bytes) -> Signature:
+    a = array("I")
+    a.frombytes(bytes(raw))
+    return tuple(a)
+
+
+class LshIndex:
+    """
+    Banded LSH over MinHash signatures.
+    - the signature is cut into `bands` bands; keys sharing any band hash are candidates
+    - with 16 bands of 4 rows, pairs at similarity >= 0.6 collide with p >= 0.89
+      and pairs at >= 0.7 with p >= 0.98; `query` then checks the real estimate
+      against `threshold`, so the threshold can change without re-indexing
+    - `buckets(sig)` are signed 64-bit ints, so they can be stored in a BIGINT column
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, threshold: float = 0.6):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = int(num_perm)
+        self.bands = int(bands)
+        self.rows = self.num_perm // self.bands
+        self.threshold = float(threshold)
+        self._lock = threading.Lock()
+        self._buckets: Dict[int, List[Hashable]] = {}
+        self._sigs: Dict[Hashable, Signature] = {}
+
+    def buckets(self, sig: Sequence[int]) -> List[int]:
+        out = []
+        for band in range(self.bands):
+            part = array("I", sig[band * self.rows:(band + 1) * self.rows]).tobytes()
+            digest = hashlib.blake2b(bytes([band]) + part, digest_size=8).digest()
+            out.append(int.from_bytes(digest, "big", signed=True))
+        return out
+
+    def add(self, key: Hashable, sig: Signature):
+        with self._lock:
+            if key in self._sigs:
+                return
+            self._sigs[key] = sig
+            for b in self.buckets(sig):
+                self._buckets.setdefault(b, []).append(key)
+
+    def query(self, sig: Signature, threshold: Optional[float] = None) -> List[Tuple[Hashable, float]]:
+        """Stored keys whose estimated similarity to `sig` is >= threshold, best first."""
+        limit = self.threshold if threshold is None else threshold
+        found: Dict[Hashable, float] = {}
+        with self._lock:
+            for b in self.buckets(sig):
+                for key in self._buckets.get(b, ()):
+                    if key not in found:
+                        found[key] = similarity(sig, self._sigs[key])
+        return sorted(((k, s) for k, s in found.items() if s >= limit), key=lambda ks: -ks[1])
+
+    def __len__(self) -> int:
+        return len(self._sigs)
+
+
+class NearDupStats:
+    """Process-wide counters for near-duplicates that were dropped."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.in_request = 0
+        self.in_bank = 0
+
+    def record(self, checked: int, in_request: int = 0, in_bank: int = 0):
+        with self._lock:
+            self.checked += checked
+            self.in_request += in_request
+            self.in_bank += in_bank
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "checked": self.checked,
+                "dropped_in_request": self.in_request,
+                "dropped_in_bank": self.in_bank,
+            }
@@ -0,0 +1,211 @@
+import json
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling Ollama while the breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    closed    -> calls pass; `threshold` consecutive failures open it
+    open      -> calls fail fast until `cooldown` seconds have passed
+    half_open -> one probe call at a time; success closes, failure re-opens
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = max(1, int(threshold))
+        self.cooldown = float(cooldown)
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._short_circuited = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == "closed":
+                return True
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+                self._state = "half_open"
+            if self._state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._short_circuited += 1
+            return False
+
+    def is_open(self) -> bool:
+        """True while calls would be short-circuited (open and still cooling down)."""
+        with self._lock:
+            return self._state == "open" and time.monotonic() - self._opened_at < self.cooldown
+
+    def record_success(self):
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == "half_open" or self._failures >= self.threshold:
+                self._state = "open"
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = 0.0
+            if self._state == "open":
+                retry_in = max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "short_circuited": self._short_circuited,
+                "retry_in_sec": round(retry_in, 1),
+            }
+
+
+class OllamaClient:
+    """
+    Shared HTTP client for Ollama.
+    - one pooled keep-alive session (no new TCP connection per generation)
+    - per-call (connect, read) timeouts
+    - bounded retries with backoff for connect errors / 502-504
+    - in-flight counter + optional concurrency cap
+    - circuit breaker: fail fast (CircuitOpenError) while Ollama is unhealthy
+    - token streaming: closing the stream early cancels the generation
+    """
+
+    def __init__(
+        self,
+        url: str,
+        pool_size: int = 10,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 120.0,
+        max_retries: int = 2,
+        backoff: float = 0.5,
+        max_concurrency: int = 0,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.url = url
+        self.connect_timeout = float(connect_timeout)
+        self.read_timeout = float(read_timeout)
+
+        # read=0: a timed-out generation is never re-sent (it would run again on the GPU)
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=max_retries,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"POST"}),
+            backoff_factor=backoff,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.breaker = breaker or CircuitBreaker()
+        self._sem = threading.BoundedSemaphore(max_concurrency) if max_concurrency > 0 else None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._calls = 0
+        self._errors = 0
+
+    def _timeout(self, read_timeout: Optional[float]) -> Tuple[float, float]:
+        read = self.read_timeout if read_timeout is None else float(read_timeout)
+        return (min(self.connect_timeout, read), read)
+
+    def available(self) -> bool:
+        """Cheap check (no side effects) so callers can skip straight to a fallback."""
+        return not self.breaker.is_open()
+
+    def _enter(self):
+        if not self.breaker.allow():
+            raise CircuitOpenError("Ollama circuit breaker is open")
+        if self._sem:
+            self._sem.acquire()
+        with self._lock:
+            self._in_flight += 1
+            self._calls += 1
+
+    def _exit(self, failed: bool):
+        with self._lock:
+            self._in_flight -= 1
+            if failed:
+                self._errors += 1
+        if failed:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        if self._sem:
+            self._sem.release()
+
+    def generate(self, payload: Dict[str, Any], read_timeout: Optional[float] = None) -> Dict[str, Any]:
+        """POST /api/generate (non-streaming) and return the decoded JSON body."""
+        self._enter()
+        failed = True
+        try:
+            r = self.session.post(self.url, json=payload, timeout=self._timeout(read_timeout))
+            r.raise_for_status()
+            out = r.json()
+            failed = False
+            return out
+        finally:
+            self._exit(failed)
+
+    def generate_stream(self, payload: Dict[str, Any], read_timeout: Optional[float] = None) -> Iterator[str]:
+        """
+        POST /api/generate with stream=True and yield `response` fragments.
+        `read_timeout` bounds the whole generation, not just the gap between chunks.
+        Closing the iterator early (caller has enough) drops the connection,
+        which makes Ollama stop generating; that counts as a success.
+        """
+        timeout = self._timeout(read_timeout)
+        ends_at = time.monotonic() + timeout[1]
+        self._enter()
+        failed = True
+        r = None
+        try:
+            r = self.session.post(self.url, json={**payload, "stream": True}, timeout=timeout, stream=True)
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if time.monotonic() > ends_at:
+                    raise requests.Timeout(f"Ollama stream exceeded {timeout[1]:.0f}s")
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(f"Ollama error: {chunk['error']}")
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    break
+            failed = False
+        except GeneratorExit:
+            failed = False
+            raise
+        finally:
+            if r is not None:
+                r.close()
+            self._exit(failed)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "calls": self._calls,
+                "errors": self._errors,
+                "breaker": self.breaker.stats(),
+            }
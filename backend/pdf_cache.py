@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+
+from pdf_extract import from_page_texts
+
+_KEY = re.compile(r"^[0-9a-f]{64}$")
+_CHUNK = 1024 * 1024
+
+
+def spool_upload(stream: BinaryIO, dir: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Copy an upload to a temp file in 1 MB chunks, hashing it on the way.
+    -> (path, sha256 hex); the caller removes the file.
+    """
+    digest = hashlib.sha256()
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=dir)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            while True:
+                chunk = stream.read(_CHUNK)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                fh.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, digest.hexdigest()
+
+
+class PdfTextCache:
+    """
+    Extracted PDF text on disk, keyed by the sha256 of the file.
+    - one JSON file per document and backend: the page count and the text of every page
+      read so far (a later request for other pages adds to it)
+    - LRU by total bytes of the files; recency is the file mtime, so it survives restarts
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()  # file name stem -> size, oldest first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = sorted(
+            (e for e in os.scandir(self.cache_dir) if e.name.endswith(".json")),
+            key=lambda e: e.stat().st_mtime,
+        )
+        for e in entries:
+            self._sizes[e.name[:-5]] = e.stat().st_size
+
+    @staticmethod
+    def valid_key(key: str) -> bool:
+        return bool(_KEY.match(key or ""))
+
+    @staticmethod
+    def _stem(key: str, backend: str) -> str:
+        # "<sha256>" for the default backend (files written before backends existed), "<sha256>.<backend>" otherwise
+        return key if backend == "pdfplumber" else f"{key}.{backend}"
+
+    def _path(self, stem: str) -> str:
+        return os.path.join(self.cache_dir, stem + ".json")
+
+    def _read(self, stem: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(stem), "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except Exception:
+            return None
+        return {"total_pages": stored["total_pages"], "pages": {int(n): t for n, t in stored["pages"].items()}}
+
+    def lookup(
+        self, key: str, pages: str = "", max_chars: int = 50000, backend: str = "pdfplumber",
+    ) -> Optional[Dict[str, Any]]:
+        """The extract_text() result for this document, if every page it needs is cached."""
+        stem = self._stem(key, backend)
+        stored = self._read(stem) if self.valid_key(key) else None
+        result = stored and from_page_texts(stored["pages"], stored["total_pages"], pages, max_chars)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if stem in self._sizes:
+                self._sizes.move_to_end(stem)
+        try:
+            os.utime(self._path(stem))
+        except OSError:
+            pass
+        return result
+
+    def put(self, key: str, total_pages: int, pages: Dict[int, str], backend: str = "pdfplumber"):
+        if not self.valid_key(key) or not pages:
+            return
+        stem = self._stem(key, backend)
+        merged = {**(self._read(stem) or {}).get("pages", {}), **pages}
+        data = json.dumps(
+            {"total_pages": total_pages, "pages": {str(n): merged[n] for n in sorted(merged)}},
+            ensure_ascii=False,
+        ).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(stem)
+        try:
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except Exception:
+            return
+        with self._lock:
+            self._sizes.pop(stem, None)
+            self._sizes[stem] = len(data)
+            self._evict()
+
+    def _evict(self):
+        total = sum(self._sizes.values())
+        while total > self.max_bytes and self._sizes:
+            stem, size = self._sizes.popitem(last=False)
+            total -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(stem))
+            except OSError:
+                pass
+
+    def purge(self, key: Optional[str] = None) -> int:
+        """Remove one document (every backend's text) or all of them; -> number of files removed."""
+        with self._lock:
+            stems = [s for s in self._sizes if not key or s.split(".")[0] == key]
+            removed = 0
+            for stem in stems:
+                self._sizes.pop(stem, None)
+                try:
+                    os.remove(self._path(stem))
+                    removed += 1
+                except OSError:
+                    pass
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._sizes),
+                "bytes": sum(self._sizes.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            }
@@ -0,0 +1,357 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import pdfplumber
+from pdfminer.pdfdevice import PDFTextDevice
+from pdfminer.pdffont import PDFUnicodeNotDefined
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdftypes import resolve1
+from pdfminer.psexceptions import PSException
+from pdfplumber.page import Page
+from pdfplumber.utils.exceptions import PdfminerException
+
+PageRanges = Optional[List[Tuple[int, Optional[int]]]]
+
+# what a file that is not a (readable) PDF raises: pdfplumber wraps pdfminer's errors,
+# but pages interpreted by the plain backend raise pdfminer's own
+PDF_ERRORS = (PdfminerException, PSException)
+
+
+def parse_page_ranges(spec: str) -> PageRanges:
+    """
+    "1-5,8,12-" -> [(1, 5), (8, 8), (12, None)] (1-based, inclusive, open end = to the last page).
+    Empty spec -> None (every page). Raises ValueError on anything else.
+    """
+    spec = (spec or "").replace(" ", "")
+    if not spec:
+        return None
+    ranges = []
+    for part in spec.split(","):
+        lo, sep, hi = part.partition("-")
+        try:
+            start = int(lo)
+            end = (int(hi) if hi else None) if sep else start
+        except ValueError:
+            raise ValueError(f"bad page range: {part!r}") from None
+        if start < 1 or (end is not None and end < start):
+            raise ValueError(f"bad page range: {part!r}")
+        ranges.append((start, end))
+    return sorted(ranges, key=lambda r: r[0])
+
+
+def _wanted(ranges: PageRanges, page_number: int) -> bool:
+    return ranges is None or any(
+        lo <= page_number and (hi is None or page_number <= hi) for lo, hi in ranges
+    )
+
+
+def _last_wanted(ranges: PageRanges) -> Optional[int]:
+    if ranges is None or any(hi is None for _, hi in ranges):
+        return None
+    return max(hi for _, hi in ranges)
+
+
+def page_count(pdf: pdfplumber.PDF) -> Optional[int]:
+    """/Count of the page tree root, without walking the pages (None if the tree is broken)."""
+    try:
+        count = resolve1(resolve1(pdf.doc.catalog["Pages"]).get("Count"))
+        return int(count) if count is not None else None
+    except Exception:
+        return None
+
+
+def _iter_page_objs(pdf: pdfplumber.PDF, ranges: PageRanges) -> Iterator[Tuple[int, PDFPage]]:
+    """
+    (page_number, pdfminer page) for the wanted pages, walking the page tree lazily and
+    stopping after the last wanted page. pdfminer's object cache is turned off, so parsed
+    content streams are not kept once their page is done.
+    """
+    pdf.doc.caching = False
+    last = _last_wanted(ranges)
+    for i, page_obj in enumerate(PDFPage.create_pages(pdf.doc), start=1):
+        if last is not None and i > last:
+            break
+        if _wanted(ranges, i):
+            yield i, page_obj
+
+
+def iter_page_text(pdf: pdfplumber.PDF, ranges: PageRanges = None) -> Iterator[Tuple[int, str]]:
+    """
+    (page_number, text) for the wanted pages, one page parsed at a time.
+    Unlike pdf.pages this keeps no Page objects alive, so memory stays at about one
+    page whatever the document size.
+    """
+    doctop = 0
+    for i, page_obj in _iter_page_objs(pdf, ranges):
+        page = Page(pdf, page_obj, page_number=i, initial_doctop=doctop)
+        try:
+            doctop += page.height
+            text = page.extract_text() or ""
+        finally:
+            page.close()
+            del page
+        yield i, text
+
+
+class _PlainText(PDFTextDevice):
+    """
+    pdfminer device that writes characters in content-stream order, with no layout
+    analysis: a new baseline starts a new line and a gap wider than ~1/6 em becomes a space.
+    """
+
+    def __init__(self, rsrcmgr: PDFResourceManager):
+        super().__init__(rsrcmgr)
+        self.parts: List[str] = []
+        self._last: Optional[Tuple[float, float, float]] = None  # baseline y, end x, font size
+
+    def begin_page(self, page: PDFPage, ctm) -> None:
+        self.parts = []
+        self._last = None
+
+    def render_char(self, matrix, font, fontsize, scaling, rise, cid, ncs, graphicstate) -> float:
+        try:
+            text = font.to_unichr(cid)
+        except PDFUnicodeNotDefined:
+            text = ""
+        a, _, _, d, x, y = matrix
+        adv = font.char_width(cid) * fontsize * scaling
+        last = self._last
+        if last is not None:
+            if abs(y - last[0]) > last[2] * 0.5:
+                self.parts.append("\n")
+            elif x - last[1] > last[2] * 0.15 and text != " ":
+                self.parts.append(" ")
+        self.parts.append(text)
+        self._last = (y, x + adv * a, fontsize * abs(d) or 1.0)
+        return adv
+
+
+def iter_plain_text(pdf: pdfplumber.PDF, ranges: PageRanges = None) -> Iterator[Tuple[int, str]]:
+    """Like iter_page_text(), but only the words: no pdfplumber objects, no layout analysis."""
+    device = _PlainText(pdf.rsrcmgr)
+    interpreter = PDFPageInterpreter(pdf.rsrcmgr, device)
+    for i, page_obj in _iter_page_objs(pdf, ranges):
+        interpreter.process_page(page_obj)
+        yield i, "".join(device.parts)
+
+
+# backend name -> (pdf, ranges) -> (page_number, text) in page order
+BACKENDS: Dict[str, Callable[[pdfplumber.PDF, PageRanges], Iterator[Tuple[int, str]]]] = {
+    "pdfplumber": iter_page_text,   # layout-aware (lines ordered by position), slowest
+    "plain": iter_plain_text,       # words in content-stream order, ~10x faster
+}
+
+
+def _backend(name: str) -> Callable[[pdfplumber.PDF, PageRanges], Iterator[Tuple[int, str]]]:
+    if name not in BACKENDS:
+        raise ValueError(f"unknown PDF backend {name!r} (one of: {', '.join(BACKENDS)})")
+    return BACKENDS[name]
+
+
+def _collect(
+    pages: Iterable[Tuple[int, str]], total: Optional[int], max_chars: int,
+    sink: Optional[Dict[int, str]] = None,
+) -> Dict[str, Any]:
+    """
+    Join page texts in order, stopping once `max_chars` characters are collected.
+    Every page read is also stored in `sink` (page number -> text) if given.
+    """
+    parts: List[str] = []
+    size = 0
+    read = 0
+    truncated = False
+    for number, text in pages:
+        if sink is not None:
+            sink[number] = text
+        read += 1
+        parts.append(text)
+        parts.append("\n")
+        size += len(text) + 1
+        if size >= max_chars:
+            truncated = True
+            break
+    return {
+        "text": "".join(parts)[:max_chars],
+        "pages_read": read,
+        "total_pages": total,
+        "truncated": truncated,
+    }
+
+
+def extract_text(
+    stream: Union[str, BinaryIO], pages: str = "", max_chars: int = 50000,
+    sink: Optional[Dict[int, str]] = None, backend: str = "pdfplumber",
+) -> Dict[str, Any]:
+    """
+    Text of the wanted pages, joined with newlines, stopping as soon as `max_chars`
+    characters are collected (the remaining pages are never parsed).
+    -> {"text", "pages_read", "total_pages", "truncated"}
+    """
+    ranges = parse_page_ranges(pages)
+    pages_of = _backend(backend)
+    with pdfplumber.open(stream) as pdf:
+        return _collect(pages_of(pdf, ranges), page_count(pdf), max_chars, sink)
+
+
+def from_page_texts(
+    page_texts: Dict[int, str], total: int, pages: str = "", max_chars: int = 50000,
+) -> Optional[Dict[str, Any]]:
+    """
+    The extract_text() result rebuilt from already extracted page texts, or None if a
+    page it would have to read is missing.
+    """
+    ranges = parse_page_ranges(pages)
+    wanted = (n for n in range(1, total + 1) if _wanted(ranges, n))
+    try:
+        return _collect(((n, page_texts[n]) for n in wanted), total, max_chars)
+    except KeyError:
+        return None
+
+
+# ===== Process pool =====
+def _extract_run(path: str, start: int, end: int, backend: str) -> List[str]:
+    """Worker: texts of pages start..end (inclusive) of the file at `path`."""
+    with pdfplumber.open(path) as pdf:
+        return [text for _, text in _backend(backend)(pdf, [(start, end)])]
+
+
+def _runs(page_numbers: List[int], size: int) -> List[Tuple[int, int]]:
+    """Sorted page numbers -> contiguous (start, end) runs of at most `size` pages."""
+    runs: List[Tuple[int, int]] = []
+    for n in page_numbers:
+        if runs and runs[-1][1] == n - 1 and n - runs[-1][0] < size:
+            runs[-1] = (runs[-1][0], n)
+        else:
+            runs.append((n, n))
+    return runs
+
+
+@contextmanager
+def _as_path(src: Union[str, BinaryIO]) -> Iterator[str]:
+    """Workers open the file themselves, so an upload stream is copied to a temp file first."""
+    if isinstance(src, str):
+        yield src
+        return
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            shutil.copyfileobj(src, fh, 1024 * 1024)
+        yield path
+    finally:
+        os.unlink(path)
+
+
+class ParallelExtractor:
+    """
+    extract_text() on a process pool for large files: the wanted pages are split into
+    runs of `chunk_pages`, each run is parsed by a worker, and the texts are reassembled
+    in page order. Only about 2 runs per worker are queued ahead, so once `max_chars`
+    is reached the rest of the book is not parsed.
+    Files under `min_bytes`, or with no more than one run of wanted pages, stay in-process.
+    """
+
+    def __init__(self, workers: int = 0, min_bytes: int = 2 * 1024 * 1024, chunk_pages: int = 8):
+        self.workers = int(workers) or (os.cpu_count() or 1)
+        self.min_bytes = int(min_bytes)
+        self.chunk_pages = max(1, int(chunk_pages))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.in_process = 0
+        self.parallel = 0
+        self.pool_errors = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # never fork the (multithreaded) app process itself: workers fork from a
+                # server process that has only this module loaded. Like spawn, each worker
+                # still imports the __main__ script, so that must be safe to import
+                ctx = multiprocessing.get_context("forkserver")
+                ctx.set_forkserver_preload(["pdf_extract"])
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+            return self._pool
+
+    def _reset_pool(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _iter_parallel(self, path: str, runs: List[Tuple[int, int]], backend: str) -> Iterator[Tuple[int, str]]:
+        pool = self._get_pool()
+        todo = iter(runs)
+        in_flight: Deque[Tuple[int, Future]] = deque()
+
+        def submit():
+            run = next(todo, None)
+            if run is not None:
+                in_flight.append((run[0], pool.submit(_extract_run, path, *run, backend)))
+
+        for _ in range(self.workers * 2):
+            submit()
+        try:
+            while in_flight:
+                start, future = in_flight.popleft()
+                texts = future.result()
+                submit()
+                yield from enumerate(texts, start=start)
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+
+    def _size(self, src: Union[str, BinaryIO]) -> int:
+        if isinstance(src, str):
+            return os.path.getsize(src)
+        pos = src.tell()
+        src.seek(0, os.SEEK_END)
+        size = src.tell()
+        src.seek(pos)
+        return size
+
+    def extract(
+        self, src: Union[str, BinaryIO], pages: str = "", max_chars: int = 50000,
+        sink: Optional[Dict[int, str]] = None, backend: str = "pdfplumber",
+    ) -> Dict[str, Any]:
+        """Same result as extract_text(src, pages, max_chars, sink, backend)."""
+        ranges = parse_page_ranges(pages)
+        _backend(backend)
+        if self.workers < 2 or self._size(src) < self.min_bytes:
+            self.in_process += 1
+            return extract_text(src, pages, max_chars, sink, backend)
+
+        with _as_path(src) as path:
+            with pdfplumber.open(path) as pdf:
+                total = page_count(pdf)
+            runs = _runs([n for n in range(1, (total or 0) + 1) if _wanted(ranges, n)], self.chunk_pages)
+            if len(runs) < 2:
+                self.in_process += 1
+                return extract_text(path, pages, max_chars, sink, backend)
+
+            self.parallel += 1
+            texts = self._iter_parallel(path, runs, backend)
+            try:
+                return _collect(texts, total, max_chars, sink)
+            except BrokenProcessPool:
+                # a worker died (e.g. out of memory): start a fresh pool next time, finish in-process
+                self.pool_errors += 1
+                self._reset_pool()
+                return extract_text(path, pages, max_chars, sink, backend)
+            finally:
+                texts.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "in_process": self.in_process,
+            "parallel": self.parallel,
+            "pool_errors": self.pool_errors,
+        }
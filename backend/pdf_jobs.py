@@ -0,0 +1,123 @@
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class _Job:
+    def __init__(self, total_pages: Optional[int]):
+        self.status = "queued"
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.total_pages = total_pages
+        self.pages: Dict[int, str] = {}  # filled page by page by the extractor (its `sink`)
+        self.result: Optional[Dict[str, Any]] = None
+        self.error = ""
+
+
+class ImportJobs:
+    """
+    Background PDF imports: submit() returns a job id at once, the work runs on a small
+    thread pool and snapshot() reports progress while it runs.
+    - finished jobs (done or error) are forgotten `ttl_sec` after they finish
+    - at most `max_jobs` are kept; submit() raises RuntimeError beyond that
+    """
+
+    def __init__(self, workers: int = 2, ttl_sec: float = 3600, max_jobs: int = 200):
+        self.ttl_sec = float(ttl_sec)
+        self.max_jobs = max(1, int(max_jobs))
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="pdf-job")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, _Job] = {}
+        self.submitted = 0
+        self.failed = 0
+        self.expired = 0
+
+    def _sweep(self, now: float):
+        for job_id in [j for j, job in self._jobs.items() if job.finished_at and now - job.finished_at >= self.ttl_sec]:
+            del self._jobs[job_id]
+            self.expired += 1
+
+    def submit(
+        self, fn: Callable[[Dict[str, Any]], Dict[str, Any]], total_pages: Optional[int],
+        cleanup: Optional[Callable[[], None]] = None,
+    ) -> str:
+        """
+        Run fn(sink) in the background; fn fills `sink` (page number -> text) as it goes
+        and returns the final result. cleanup() runs once the job is over, even if it
+        never started or was refused.
+        """
+        job = _Job(total_pages)
+        with self._lock:
+            self._sweep(time.time())
+            full = len(self._jobs) >= self.max_jobs
+            if not full:
+                job_id = secrets.token_hex(8)
+                self._jobs[job_id] = job
+                self.submitted += 1
+        if full:
+            if cleanup:
+                cleanup()
+            raise RuntimeError("too many import jobs")
+        try:
+            self._pool.submit(self._run, job, fn, cleanup)
+        except BaseException:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            if cleanup:
+                cleanup()
+            raise
+        return job_id
+
+    def _run(self, job: _Job, fn: Callable[[Dict[str, Any]], Dict[str, Any]], cleanup: Optional[Callable[[], None]]):
+        job.status = "running"
+        try:
+            job.result = fn(job.pages)
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e) or e.__class__.__name__
+            job.status = "error"
+            with self._lock:
+                self.failed += 1
+        finally:
+            job.finished_at = time.time()
+            if cleanup:
+                cleanup()
+
+    def snapshot(self, job_id: str, max_chars: int = 50000) -> Optional[Dict[str, Any]]:
+        """Status, pages done / total and the text so far (the full result once done), or None."""
+        with self._lock:
+            self._sweep(time.time())
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        out: Dict[str, Any] = {
+            "job": job_id,
+            "status": job.status,
+            "total_pages": job.total_pages,
+            "elapsed_sec": round((job.finished_at or time.time()) - job.created_at, 3),
+        }
+        if job.status == "done":
+            out.update(job.result or {})
+            out["pages_done"] = out.get("pages_read", 0)
+            return out
+        pages = dict(job.pages)  # the worker keeps adding pages
+        out["pages_done"] = len(pages)
+        out["text"] = "".join(pages[n] + "\n" for n in sorted(pages))[:max_chars]
+        if job.error:
+            out["error"] = job.error
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            by_status: Dict[str, int] = {}
+            for job in self._jobs.values():
+                by_status[job.status] = by_status.get(job.status, 0) + 1
+            return {
+                "jobs": len(self._jobs),
+                **by_status,
+                "submitted": self.submitted,
+                "failed": self.failed,
+                "expired": self.expired,
+            }
@@ -0,0 +1,195 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+
+class SparePool:
+    """
+    Bounded store of validated, deduplicated surplus questions.
+    - keys are evicted LRU once there are more than `max_keys`
+    - each key keeps at most `per_key` questions (oldest dropped first)
+    - questions older than `max_age_sec` are never served
+    """
+
+    def __init__(self, max_keys: int = 500, per_key: int = 50, max_age_sec: float = 6 * 3600):
+        self.max_keys = max(1, int(max_keys))
+        self.per_key = max(1, int(per_key))
+        self.max_age_sec = float(max_age_sec)
+        self._lock = threading.Lock()
+        self._pools: "OrderedDict[Hashable, Deque[Tuple[float, Dict[str, Any]]]]" = OrderedDict()
+        self.added = 0
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, key: Hashable, questions: List[Dict[str, Any]]):
+        if not questions:
+            return
+        now = time.time()
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = deque(maxlen=self.per_key)
+            self._pools.move_to_end(key)
+            for q in questions:
+                pool.append((now, q))
+            self.added += len(questions)
+            while len(self._pools) > self.max_keys:
+                self._pools.popitem(last=False)
+
+    def pop(self, key: Hashable, reject: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Optional[Dict[str, Any]]:
+        """Newest usable question for `key` (skipping `reject(q)` ones), or None."""
+        got = self.take(key, 1, reject)
+        return got[0] if got else None
+
+    def take(
+        self, key: Hashable, n: int, reject: Optional[Callable[[Dict[str, Any]], bool]] = None
+    ) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        cutoff = time.time() - self.max_age_sec
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool:
+                self._pools.move_to_end(key)
+                kept: List[Tuple[float, Dict[str, Any]]] = []
+                while pool and len(out) < n:
+                    added_at, q = pool.pop()
+                    if added_at < cutoff:
+                        pool.clear()  # everything older is stale too
+                        break
+                    if reject and reject(q):
+                        kept.append((added_at, q))
+                        continue
+                    out.append(q)
+                pool.extend(reversed(kept))
+                if not pool:
+                    del self._pools[key]
+            if out:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return out
+
+    def size(self, key: Hashable) -> int:
+        cutoff = time.time() - self.max_age_sec
+        with self._lock:
+            pool = self._pools.get(key)
+            return sum(1 for added_at, _ in pool if added_at >= cutoff) if pool else 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "keys": len(self._pools),
+                "questions": sum(len(p) for p in self._pools.values()),
+                "added": self.added,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class Prewarmer:
+    """
+    Background worker that keeps `target` questions in stock for each hot cell.
+    A cell is refilled when it drops below `low_water`; at most `concurrency`
+    refills run at once and only while `can_run()` says the backend has room.
+    `fill(cell, n)` generates up to n validated questions for the cell.
+    The hit ratio only counts requests for these cells; other requests are counted apart.
+    """
+
+    def __init__(
+        self,
+        pool: SparePool,
+        cells: List[Tuple[Hashable, Tuple]],
+        fill: Callable[[Tuple, int], List[Dict[str, Any]]],
+        target: int = 20,
+        low_water: int = 5,
+        concurrency: int = 1,
+        interval_sec: float = 10.0,
+        can_run: Optional[Callable[[], bool]] = None,
+    ):
+        self.pool = pool
+        self.cells = cells  # [(pool_key, cell_args tuple)]
+        self._keys = {key for key, _ in cells}
+        self.fill = fill
+        self.target = max(1, int(target))
+        self.low_water = max(0, min(int(low_water), self.target - 1))
+        self.interval_sec = float(interval_sec)
+        self.can_run = can_run or (lambda: True)
+        self._slots = threading.BoundedSemaphore(max(1, int(concurrency)))
+        self._lock = threading.Lock()
+        self._refilling: set = set()
+        self._thread: Optional[threading.Thread] = None
+        self._started_at = 0.0
+        self.refills = 0
+        self.refill_errors = 0
+        self.questions_added = 0
+        self.served = 0
+        self.requested = 0
+        self.requested_outside = 0
+
+    def start(self):
+        if self._thread:
+            return
+        self._started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="pool-prewarm", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            for key, args in self.cells:
+                if not self.can_run():
+                    break
+                if self.pool.size(key) >= self.low_water:
+                    continue
+                with self._lock:
+                    if key in self._refilling:
+                        continue
+                # wait for a free slot (bounded concurrency towards the model)
+                self._slots.acquire()
+                with self._lock:
+                    self._refilling.add(key)
+                threading.Thread(target=self._refill, args=(key, args), daemon=True).start()
+            time.sleep(self.interval_sec)
+
+    def _refill(self, key: Hashable, args: Tuple):
+        try:
+            n = self.target - self.pool.size(key)
+            if n > 0:
+                qs = self.fill(args, n)
+                self.pool.add(key, qs)
+                with self._lock:
+                    self.refills += 1
+                    self.questions_added += len(qs)
+        except Exception:
+            with self._lock:
+                self.refill_errors += 1
+        finally:
+            with self._lock:
+                self._refilling.discard(key)
+            self._slots.release()
+
+    def record(self, key: Hashable, requested: int, served: int):
+        """Count how much of a request for pool `key` was answered from stock."""
+        with self._lock:
+            if key not in self._keys:
+                self.requested_outside += requested
+                return
+            self.requested += requested
+            self.served += served
+
+    def stats(self) -> Dict[str, Any]:
+        levels = {"/".join(str(a) for a in args): self.pool.size(key) for key, args in self.cells}
+        with self._lock:
+            minutes = max((time.time() - self._started_at) / 60.0, 1e-9) if self._started_at else 0
+            return {
+                "running": self._thread is not None,
+                "cells": len(self.cells),
+                "cells_below_low_water": sum(1 for v in levels.values() if v < self.low_water),
+                "stock_total": sum(levels.values()),
+                "stock": levels,
+                "refills": self.refills,
+                "refill_errors": self.refill_errors,
+                "refill_rate_per_min": round(self.questions_added / minutes, 2) if minutes else 0.0,
+                "hit_ratio": round(self.served / self.requested, 3) if self.requested else 0.0,
+                "requested_outside_cells": self.requested_outside,
+            }
@@ -0,0 +1,148 @@
+from typing import Any, Dict, List
+
+# One JSON Schema per question type. Sent to Ollama as the structured `format`
+# and used by _validate_one (app.py) after its light coercion step.
+
+_ID = {"type": "integer"}
+_TEXT = {"type": "string", "minLength": 1}
+_CHOICES = {"type": "array", "items": {"type": "string"}, "minItems": 4, "maxItems": 4}
+_CORRECT_INDEX = {"type": "integer", "minimum": 0, "maximum": 3}
+
+QUESTION_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "mcq": {
+        "type": "object",
+        "properties": {
+            "id": _ID,
+            "type": {"const": "mcq"},
+            "question": _TEXT,
+            "choices": _CHOICES,
+            "correctIndex": _CORRECT_INDEX,
+        },
+        "required": ["type", "question", "choices", "correctIndex"],
+    },
+    "reading_mcq": {
+        "type": "object",
+        "properties": {
+            "id": _ID,
+            "type": {"const": "reading_mcq"},
+            "passage": _TEXT,
+            "question": _TEXT,
+            "choices": _CHOICES,
+            "correctIndex": _CORRECT_INDEX,
+        },
+        "required": ["type", "passage", "question", "choices", "correctIndex"],
+    },
+    "tf": {
+        "type": "object",
+        "properties": {
+            "id": _ID,
+            "type": {"const": "tf"},
+            "question": _TEXT,
+            "answer": {"type": "boolean"},
+        },
+        "required": ["type", "question", "answer"],
+    },
+    "fill": {
+        "type": "object",
+        "properties": {
+            "id": _ID,
+            "type": {"const": "fill"},
+            "question": _TEXT,
+            "answer": _TEXT,
+        },
+        "required": ["type", "question", "answer"],
+    },
+    "reorder": {
+        "type": "object",
+        "properties": {
+            "id": _ID,
+            "type": {"const": "reorder"},
+            "question": _TEXT,
+            "words": {"type": "array", "items": {"type": "string"}, "minItems": 3},
+            "answer": _TEXT,
+        },
+        "required": ["type", "question", "words", "answer"],
+    },
+}
+
+# /api/ai/* lesson quiz shape (see build_prompt / build_lesson_prompt)
+LESSON_QUESTION_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "qtype": {"const": "mcq"},
+        "question": _TEXT,
+        "choices": _CHOICES,
+        "answer": _TEXT,
+        "explanation": {"type": "string"},
+    },
+    "required": ["qtype", "question", "choices", "answer", "explanation"],
+}
+
+
+def _wrap(item_schema: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "object",
+        "properties": {"questions": {"type": "array", "items": item_schema}},
+        "required": ["questions"],
+    }
+
+
+def batch_format(types: List[str]) -> Dict[str, Any]:
+    """Ollama `format` for {"questions": [...]} restricted to the allowed types."""
+    schemas = [QUESTION_SCHEMAS[t] for t in types if t in QUESTION_SCHEMAS] or [QUESTION_SCHEMAS["mcq"]]
+    return _wrap(schemas[0] if len(schemas) == 1 else {"anyOf": schemas})
+
+
+LESSON_QUIZ_FORMAT = _wrap(LESSON_QUESTION_SCHEMA)
+
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "boolean": bool,
+    "integer": int,
+}
+
+
+def matches(schema: Dict[str, Any], value: Any) -> bool:
+    """
+    Minimal JSON Schema check for the keywords used above
+    (type, const, properties, required, items, anyOf, min/max Items/Length, minimum/maximum).
+    """
+    if "anyOf" in schema:
+        return any(matches(s, value) for s in schema["anyOf"])
+    if "const" in schema and value != schema["const"]:
+        return False
+
+    t = schema.get("type")
+    if t:
+        if not isinstance(value, _TYPES[t]):
+            return False
+        # bool is an int subclass in Python
+        if t == "integer" and isinstance(value, bool):
+            return False
+
+    if isinstance(value, str):
+        if len(value) < schema.get("minLength", 0):
+            return False
+    elif isinstance(value, list):
+        if len(value) < schema.get("minItems", 0):
+            return False
+        if "maxItems" in schema and len(value) > schema["maxItems"]:
+            return False
+        if "items" in schema and not all(matches(schema["items"], v) for v in value):
+            return False
+    elif isinstance(value, dict):
+        if any(k not in value for k in schema.get("required", [])):
+            return False
+        props = schema.get("properties", {})
+        if not all(matches(props[k], v) for k, v in value.items() if k in props):
+            return False
+    elif isinstance(value, int) and not isinstance(value, bool):
+        if "minimum" in schema and value < schema["minimum"]:
+            return False
+        if "maximum" in schema and value > schema["maximum"]:
+            return False
+
+    return True
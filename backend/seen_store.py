@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Tuple
+
+from bloom import BloomFilter
+
+
+class SeenStore:
+    """
+    Server-side "already seen" sets, one Bloom filter per session (or class) id.
+    - memory bound: at most `max_sessions` filters of a fixed size each (LRU)
+    - sessions idle for more than `ttl_sec` are forgotten
+    - a full filter is replaced by a fresh one rather than let its error rate climb
+      (the session then forgets what it saw before; it never wrongly blocks more)
+    """
+
+    def __init__(
+        self, max_sessions: int = 5000, capacity: int = 5000,
+        error_rate: float = 0.01, ttl_sec: float = 7 * 24 * 3600,
+    ):
+        self.max_sessions = max(1, int(max_sessions))
+        self.capacity = max(1, int(capacity))
+        self.error_rate = float(error_rate)
+        self.ttl_sec = float(ttl_sec)
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, Tuple[float, BloomFilter]]" = OrderedDict()
+        self.added = 0
+        self.rejected = 0
+        self.resets = 0
+
+    def _get(self, session: str, create: bool):
+        now = time.time()
+        hit = self._sessions.get(session)
+        if hit and now - hit[0] >= self.ttl_sec:
+            del self._sessions[session]
+            hit = None
+        if hit is None:
+            if not create:
+                return None
+            hit = (now, BloomFilter(self.capacity, self.error_rate))
+            self._sessions[session] = hit
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._sessions[session] = (now, hit[1])
+        self._sessions.move_to_end(session)
+        return hit[1]
+
+    def add(self, session: str, items: Iterable[str]):
+        items = [i for i in items if i]
+        if not session or not items:
+            return
+        with self._lock:
+            bloom = self._get(session, create=True)
+            for item in items:
+                if bloom.saturated:
+                    bloom = BloomFilter(self.capacity, self.error_rate)
+                    self._sessions[session] = (time.time(), bloom)
+                    self.resets += 1
+                if bloom.add(item):
+                    self.added += 1
+
+    def seen(self, session: str, item: str) -> bool:
+        if not session or not item:
+            return False
+        with self._lock:
+            bloom = self._get(session, create=False)
+            hit = bloom is not None and item in bloom
+            if hit:
+                self.rejected += 1
+            return hit
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": sum(b.nbytes for _, b in self._sessions.values()),
+                "added": self.added,
+                "rejected": self.rejected,
+                "resets": self.resets,
+            }